@@ -0,0 +1,209 @@
+import argparse
+import asyncio
+import json
+import socket
+import sys
+import time
+
+import numpy as np
+
+from audio_io import Decimator, to_pcm16
+from audio_to_phonenumber import DTMF_BAND, DTMFStreamDecoder
+from dtmf_timing import DEFAULT_TIMING
+from morse_to_text import MorseStreamDecoder
+from phonenumber_to_audio import DIGITS, TONE_PEAK, digit_indices, iter_phone_number_blocks
+from text_to_morse import SAMPLE_RATE as MORSE_RATE, iter_morse_blocks, symbol_lengths, text_to_morse
+
+# Encoder -> link -> streaming decoder, all as coroutines of one event loop, so many
+# sessions share a process and nothing goes through wave files. The link is either a
+# bounded asyncio.Queue of sample blocks or a socketpair carrying 16-bit PCM; in both
+# the sender waits while the link is full. Each decoded symbol is reported with the time
+# from sending the block that completed it to the decoder emitting it.
+
+BLOCK_DURATION = 0.02  # seconds of audio per link block, like an audio device buffer
+
+
+class Session:
+    # One transmission. kind is 'dtmf' or 'morse'; with realtime the sender is paced at
+    # the audio rate instead of sending as fast as the link accepts blocks.
+
+    def __init__(self, kind, payload, timing=DEFAULT_TIMING, realtime=False):
+        self.kind = kind
+        self.payload = payload
+        self.timing = timing
+        self.realtime = realtime
+        if kind == 'dtmf':
+            self.sample_rate, self.peak = 44100, TONE_PEAK
+        else:
+            self.sample_rate, self.peak = MORSE_RATE, 1.0
+        self.block_size = int(self.sample_rate * BLOCK_DURATION)
+        self.symbol_ends = self._symbol_ends()
+        self._sent = []  # (samples sent so far, time) per block
+        self.received = ''
+        self.latencies = []
+
+    def _symbol_ends(self):
+        # Sample offset at which every payload symbol has been fully sent
+        if self.kind == 'dtmf':
+            period = int(self.sample_rate * self.timing.tone) + int(self.sample_rate * self.timing.gap)
+            return (np.arange(len(digit_indices(self.payload))) + 1) * period
+        _, total = symbol_lengths(self.sample_rate)
+        ends = []
+        offset = 0
+        for char in self.payload:
+            offset += sum(total[ord(symbol)] for symbol in text_to_morse(char) + ' ')
+            ends.append(offset)
+        return np.array(ends)
+
+    def audio_blocks(self):
+        if self.kind == 'dtmf':
+            synthesized = iter_phone_number_blocks(self.payload, self.sample_rate, 1, self.timing)
+        else:
+            synthesized = iter_morse_blocks(text_to_morse(self.payload), symbols_per_block=8,
+                                            sample_rate=self.sample_rate)
+        for block in synthesized:
+            for start in range(0, len(block), self.block_size):
+                yield block[start:start + self.block_size]
+
+    def decoder(self):
+        # Blocks are decimated before the decoder, as in decode_phone_stream
+        if self.kind == 'dtmf':
+            decimator = Decimator(self.sample_rate, 8000, DTMF_BAND)
+            decoder = DTMFStreamDecoder(decimator.out_rate, min_silence=self.timing.min_silence())
+        else:
+            decimator = Decimator(self.sample_rate, 8000)
+            decoder = MorseStreamDecoder(decimator.out_rate)
+        return decimator, decoder
+
+    def mark_sent(self, n_samples):
+        total = self._sent[-1][0] + n_samples if self._sent else n_samples
+        self._sent.append((total, time.perf_counter()))
+
+    def mark_received(self, symbols):
+        now = time.perf_counter()
+        sent = np.array([total for total, _ in self._sent])
+        for symbol in symbols:
+            index = len(self.received)
+            self.received += symbol
+            if index < len(self.symbol_ends):
+                block = min(np.searchsorted(sent, self.symbol_ends[index]), len(sent) - 1)
+                self.latencies.append(now - self._sent[block][1])
+
+    def report(self, seconds):
+        latencies = np.array(self.latencies) * 1000
+        audio_seconds = self._sent[-1][0] / self.sample_rate if self._sent else 0.0
+        result = {'kind': self.kind, 'sent': self.payload, 'received': self.received,
+                  'ok': self.received == self.payload, 'seconds': seconds,
+                  'audio_seconds': audio_seconds, 'blocks': len(self._sent)}
+        if len(latencies):
+            result['latency_ms'] = {'mean': float(np.mean(latencies)), 'p50': float(np.median(latencies)),
+                                    'p95': float(np.percentile(latencies, 95)), 'max': float(np.max(latencies))}
+        return result
+
+
+async def send_blocks(session, put):
+    start = time.perf_counter()
+    for block in session.audio_blocks():
+        await put(block)
+        session.mark_sent(len(block))
+        if session.realtime:
+            await asyncio.sleep(max(start + session._sent[-1][0] / session.sample_rate - time.perf_counter(), 0))
+        else:
+            await asyncio.sleep(0)  # let the other sessions run between blocks
+
+async def receive_blocks(session, blocks):
+    decimator, decoder = session.decoder()
+    async for block in blocks:
+        session.mark_received(decoder.feed(decimator.process(block)))
+    session.mark_received(decoder.feed(decimator.flush()) + decoder.flush())
+
+async def run_queue_session(session, queue_size=8):
+    queue = asyncio.Queue(queue_size)
+
+    async def produce():
+        await send_blocks(session, queue.put)
+        await queue.put(None)
+
+    async def blocks():
+        while (block := await queue.get()) is not None:
+            yield block
+
+    await asyncio.gather(produce(), receive_blocks(session, blocks()))
+
+async def run_socket_session(session, buffer_size=1 << 14):
+    # The link carries what a sound card would, 16-bit PCM without any framing
+    sender_socket, receiver_socket = socket.socketpair()
+    for sock in (sender_socket, receiver_socket):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, buffer_size)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, buffer_size)
+    _, writer = await asyncio.open_connection(sock=sender_socket)
+    reader, receiver_writer = await asyncio.open_connection(sock=receiver_socket)
+
+    async def write(block):
+        writer.write(to_pcm16(block, session.peak).tobytes())
+        await writer.drain()
+
+    async def produce():
+        await send_blocks(session, write)
+        writer.close()
+        await writer.wait_closed()
+
+    async def blocks():
+        pending = b''
+        while data := await reader.read(2 * session.block_size):
+            data = pending + data
+            pending = data[len(data) // 2 * 2:]
+            yield np.frombuffer(data[:len(data) // 2 * 2], dtype=np.int16)
+
+    await asyncio.gather(produce(), receive_blocks(session, blocks()))
+    receiver_writer.close()
+
+async def run_session(session, transport='queue', queue_size=8):
+    start = time.perf_counter()
+    if transport == 'socket':
+        await run_socket_session(session)
+    else:
+        await run_queue_session(session, queue_size)
+    return session.report(time.perf_counter() - start)
+
+async def run_sessions(sessions, transport='queue', queue_size=8):
+    # Yields the reports in the order the sessions finish
+    for finished in asyncio.as_completed([run_session(session, transport, queue_size) for session in sessions]):
+        yield await finished
+
+def random_sessions(n_sessions, kind='mixed', length=16, realtime=False, seed=0):
+    rng = np.random.default_rng(seed)
+    words = ['HELLO', 'WORLD', 'MORSE', 'CODE', 'AUDIO', 'LINK', 'TEST', '42']
+    sessions = []
+    for index in range(n_sessions):
+        session_kind = kind if kind != 'mixed' else ('dtmf', 'morse')[index % 2]
+        if session_kind == 'dtmf':
+            payload = ''.join(rng.choice(list(DIGITS), length))
+        else:
+            payload = ' '.join(rng.choice(words, max(1, length // 5)))
+        sessions.append(Session(session_kind, payload, realtime=realtime))
+    return sessions
+
+async def main_async(args):
+    sessions = random_sessions(args.sessions, args.kind, args.length, args.realtime, args.seed)
+    start = time.perf_counter()
+    n_ok = 0
+    async for report in run_sessions(sessions, args.transport, args.queue_size):
+        n_ok += report['ok']
+        print(json.dumps(report), flush=True)
+    print(f"{n_ok}/{len(sessions)} sessions decoded correctly in {time.perf_counter() - start:.2f} s",
+          file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run encode -> link -> decode sessions concurrently in one process.")
+    parser.add_argument('--sessions', type=int, default=8)
+    parser.add_argument('--kind', choices=('dtmf', 'morse', 'mixed'), default='mixed')
+    parser.add_argument('--length', type=int, default=16, help="DTMF digits or Morse characters per session")
+    parser.add_argument('--transport', choices=('queue', 'socket'), default='queue')
+    parser.add_argument('--queue-size', type=int, default=8, help="blocks the queue link holds")
+    parser.add_argument('--realtime', action='store_true', help="pace the senders at the audio rate")
+    parser.add_argument('--seed', type=int, default=0)
+    asyncio.run(main_async(parser.parse_args(argv)))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+import numpy as np
+import struct
+import wave
+from collections import namedtuple
+
+from profiling import stage
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+SAMPLE_DTYPES = {
+    (WAVE_FORMAT_PCM, 1): np.dtype('u1'),
+    (WAVE_FORMAT_PCM, 2): np.dtype('<i2'),
+    (WAVE_FORMAT_PCM, 3): np.dtype('u1'),  # 24-bit, assembled into int32 on read
+    (WAVE_FORMAT_PCM, 4): np.dtype('<i4'),
+    (WAVE_FORMAT_IEEE_FLOAT, 4): np.dtype('<f4'),
+    (WAVE_FORMAT_IEEE_FLOAT, 8): np.dtype('<f8'),
+}
+
+# Same fields as wave.Wave_read.getparams(), so it can be passed to setparams()
+WaveParams = namedtuple('WaveParams', 'nchannels sampwidth framerate nframes comptype compname')
+
+
+def convert_samples(samples, sample_width):
+    # Raw samples of one channel as stored (see SAMPLE_DTYPES) to signed numbers:
+    # 8-bit is centered and the three bytes of 24-bit are assembled into int32
+    if sample_width == 1:
+        return samples.astype(np.int16) - 128
+    if sample_width == 3:
+        samples = samples.astype(np.int32)
+        return (samples[:, 0] << 8 | samples[:, 1] << 16 | samples[:, 2] << 24) >> 8
+    return samples
+
+def pcm_samples(frames, sample_width, n_channels, channel=0):
+    # One channel of the PCM bytes returned by wave's readframes, e.g. from a stream
+    # that cannot be memory-mapped like WaveFile does
+    shape = (-1, n_channels) + ((3,) if sample_width == 3 else ())
+    raw = np.frombuffer(frames, dtype=SAMPLE_DTYPES[WAVE_FORMAT_PCM, sample_width]).reshape(shape)
+    return convert_samples(raw[:, channel], sample_width)
+
+
+class WaveFile:
+    # Memory-maps the PCM data chunk of a wave file. Opening it only parses the header;
+    # samples are read from disk when they are touched. 16-bit, 32-bit and float channels
+    # are strided views into the map, 8-bit is centered and 24-bit is assembled on read.
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        with open(file_path, 'rb') as file:
+            riff, _, wave_id = struct.unpack('<4sI4s', file.read(12))
+            if riff != b'RIFF' or wave_id != b'WAVE':
+                raise ValueError("Not a wave file")
+            file_size = file.seek(0, 2)
+            position = 12
+            format_tag = None
+            while True:
+                file.seek(position)
+                header = file.read(8)
+                if len(header) < 8:
+                    raise ValueError("No data chunk found")
+                chunk_id, chunk_size = struct.unpack('<4sI', header)
+                if chunk_id == b'fmt ':
+                    fmt = file.read(chunk_size)
+                    format_tag, self.n_channels, self.frame_rate, _, _, bits = struct.unpack('<HHIIHH', fmt[:16])
+                    if format_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+                        format_tag = struct.unpack('<H', fmt[24:26])[0]
+                elif chunk_id == b'data':
+                    data_offset = position + 8
+                    data_size = min(chunk_size, file_size - data_offset)
+                    break
+                position += 8 + chunk_size + (chunk_size & 1)
+
+        if format_tag is None:
+            raise ValueError("No fmt chunk found")
+        self.sample_width = bits // 8
+        dtype = SAMPLE_DTYPES.get((format_tag, self.sample_width))
+        if dtype is None:
+            raise ValueError("Unsupported sample format")
+        self.is_float = format_tag == WAVE_FORMAT_IEEE_FLOAT
+        self.n_frames = data_size // (self.sample_width * self.n_channels)
+
+        shape = (self.n_frames, self.n_channels)
+        if self.sample_width == 3:
+            shape += (3,)
+        if self.n_frames == 0:
+            self.raw = np.zeros(shape, dtype=dtype)
+        else:
+            self.raw = np.memmap(file_path, dtype=dtype, mode='r', offset=data_offset, shape=shape)
+
+    @property
+    def params(self):
+        return WaveParams(self.n_channels, self.sample_width, self.frame_rate, self.n_frames, 'NONE', 'not compressed')
+
+    def read(self, start=0, stop=None, channel=0):
+        return convert_samples(self.raw[start:stop, channel], self.sample_width)
+
+    def mono(self, start=0, stop=None):
+        if self.n_channels == 1:
+            return self.read(start, stop)
+        return np.mean([self.read(start, stop, channel) for channel in range(self.n_channels)], axis=0)
+
+    def iter_windows(self, window, hop=None, channel=0):
+        hop = hop or window
+        for start in range(0, self.n_frames, hop):
+            yield self.read(start, start + window, channel)
+
+
+def lowpass_taps(cutoff, rate, n_taps):
+    # Blackman-windowed sinc with unit gain at DC
+    n = np.arange(n_taps) - (n_taps - 1) / 2
+    taps = np.sinc(2 * cutoff / rate * n) * np.blackman(n_taps)
+    return taps / np.sum(taps)
+
+class Decimator:
+    # Streaming anti-aliased decimation by an integer factor, so the detectors run at about
+    # target_rate instead of the native rate. The FIR output is only computed for the kept
+    # samples (polyphase), from strided windows over the block and the filter history.
+    # band=(low, high) turns the anti-aliasing filter into a band-pass.
+
+    def __init__(self, frame_rate, target_rate=8000, band=None, n_taps=None):
+        self.factor = max(1, int(frame_rate // target_rate))
+        self.out_rate = frame_rate / self.factor
+        if self.out_rate == int(self.out_rate):
+            self.out_rate = int(self.out_rate)
+        if band is None:
+            n_taps = n_taps or 20 * self.factor + 1
+            taps = lowpass_taps(0.4 * self.out_rate, frame_rate, n_taps)
+        else:
+            # About 400 Hz wide transition bands around the band edges
+            n_taps = n_taps or int(6 * frame_rate / 400) | 1
+            taps = lowpass_taps(band[1], frame_rate, n_taps) - lowpass_taps(band[0], frame_rate, n_taps)
+        self._taps = taps[::-1].astype(np.float32)
+        self._history = np.zeros(n_taps - 1, dtype=np.float32)
+        self._next = n_taps - 1  # index of the next output sample in history + block
+
+    def process(self, block):
+        samples = np.concatenate((self._history, np.asarray(block, dtype=np.float32)))
+        n_taps = len(self._taps)
+        if len(samples) < n_taps:
+            return np.zeros(0, dtype=np.float32)  # empty block, nothing new to filter
+        n_out = max(0, -(-(len(samples) - self._next) // self.factor))
+        windows = np.lib.stride_tricks.sliding_window_view(samples, n_taps)
+        output = windows[self._next - (n_taps - 1)::self.factor][:n_out] @ self._taps
+        self._next += n_out * self.factor - (len(samples) - (n_taps - 1))
+        self._history = samples[len(samples) - (n_taps - 1):]
+        return output
+
+    def flush(self):
+        # Pushes the tail out of the filter, which delays the signal by half its length
+        return self.process(np.zeros(len(self._taps) // 2, dtype=np.float32))
+
+
+def decimate(audio_data, frame_rate, target_rate=8000, band=None):
+    with stage('decimate', samples=len(audio_data)):
+        decimator = Decimator(frame_rate, target_rate, band)
+        return np.concatenate((decimator.process(audio_data), decimator.flush())), decimator.out_rate
+
+def read_decimated(file_path, target_rate=8000, band=None, channel=0, block_size=1 << 16):
+    # Reads the file window by window through the Decimator, never holding the full-rate signal
+    with stage('read') as read_stage:
+        wave_file = WaveFile(file_path)
+        decimator = Decimator(wave_file.frame_rate, target_rate, band)
+        blocks = [decimator.process(block) for block in wave_file.iter_windows(block_size, channel=channel)]
+        blocks.append(decimator.flush())
+        read_stage.count(samples=wave_file.n_frames)
+    return np.concatenate(blocks), decimator.out_rate
+
+def read_wave_file(file_path, channel=0):
+    with stage('read') as read_stage:
+        wav_file = WaveFile(file_path)
+        read_stage.count(samples=wav_file.n_frames)
+        return wav_file.read(channel=channel), wav_file.frame_rate
+
+
+def to_pcm16(block, peak=1.0):
+    # Float blocks scaled by peak to 16-bit PCM, int16 blocks pass unchanged
+    block = np.asarray(block)
+    if block.dtype != np.int16:
+        block = np.int16(np.clip(block / peak, -1, 1) * 32767)
+    return block
+
+
+class WaveWriter:
+    # Writes 16-bit PCM to a wave file block by block, so a transmission never has to
+    # be held in memory as a whole. Float blocks are scaled by a fixed, known peak
+    # instead of the maximum of the finished signal, so no second pass is needed.
+
+    def __init__(self, filename, sample_rate, peak=1.0, n_channels=1):
+        self.peak = peak
+        self.frames_written = 0
+        self._wav_file = wave.open(filename, 'wb')
+        self._wav_file.setnchannels(n_channels)
+        self._wav_file.setsampwidth(2)
+        self._wav_file.setframerate(sample_rate)
+
+    def write(self, block):
+        block = to_pcm16(block, self.peak)
+        self._wav_file.writeframes(block.tobytes())
+        self.frames_written += len(block)
+
+    def write_blocks(self, blocks):
+        for block in blocks:
+            self.write(block)
+
+    def close(self):
+        self._wav_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def iter_symbol_chunks(symbols, chunk_size):
+    # Splits a string or any iterable of symbols into strings of chunk_size symbols
+    symbols = iter(symbols)
+    return iter(lambda: ''.join(next(symbols, '') for _ in range(chunk_size)), '')
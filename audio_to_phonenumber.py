@@ -1,5 +1,10 @@
 import numpy as np
+import sys
 import wave
+from audio_io import Decimator, pcm_samples, read_decimated, read_wave_file
+from dtmf_timing import DEFAULT_TIMING, DTMFTiming
+from profiling import stage
+from spectrogram import spectrogram
 
 
 # DTMF frequencies
@@ -22,35 +27,56 @@ DTMF_FREQS = {
     (941, 1633): 'D'
 }
 
-def read_wave_file(file_path):
-    with wave.open(file_path, 'r') as wav_file:
-        frames = wav_file.readframes(-1)
-        frame_rate = wav_file.getframerate()
-        audio_data = np.frombuffer(frames, dtype=np.int16)
-    return audio_data, frame_rate
+DTMF_LOW = (697, 770, 852, 941)
+DTMF_HIGH = (1209, 1336, 1477, 1633)
+DTMF_BIN_FREQS = np.array(DTMF_LOW + DTMF_HIGH, dtype=np.float64)
+DTMF_BAND = (450, 1900)  # band-pass of the decimating front-end
 
-def split_audio_on_silence(audio_file, chunk_size=128):
-    audio_data, frame_rate = read_wave_file(audio_file)
+TONE_CONTRAST = 3  # minimum ratio of tone to noise level, noise alone reaches about 2
+CHUNK_DURATION = 128 / 44100  # default analysis chunk, 128 samples at 44.1 kHz
+DTMF_WINDOW = 128  # samples per spectrogram frame, 16 ms at 8 kHz
+DTMF_N_FFT = 1024  # zero padding for 8 Hz bins at 8 kHz
+TIMING_WARMUP = 2.0  # seconds buffered by the stream decoder to infer the timing
 
-    silence_threshold = np.mean(np.abs(audio_data)) * 0.5
-    chunks = []
-    start = 0
-    end = 0
-    silent_chunks = 0
+def default_chunk_size(frame_rate):
+    return max(1, int(round(frame_rate * CHUNK_DURATION)))
 
-    for i in range(0, len(audio_data)- chunk_size, chunk_size):
-        if np.mean(np.abs(audio_data[i:i+chunk_size])) < silence_threshold:
-            silent_chunks += 1
-            end = i if silent_chunks == 1 else end
-        else:
-            if silent_chunks * chunk_size > frame_rate * 0.02:
-                chunks.append(audio_data[start:end])
-                start = i
-            silent_chunks = 0
-    
-    chunks.append(audio_data[start:end])
-    
-    return chunks, frame_rate
+def segment_on_silence(audio_data, frame_rate, chunk_size=None, min_silence=0.02, silence_threshold=None):
+    # Returns an (n, 2) array of (start, end) sample indices of the tones between silences
+    # longer than min_silence. Shorter dips are kept inside the surrounding tone.
+    chunk_size = chunk_size or default_chunk_size(frame_rate)
+    if len(audio_data) == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    magnitude = np.abs(audio_data.astype(np.float32))
+    if silence_threshold is None:
+        silence_threshold = np.mean(magnitude) * 0.5
+
+    frame_starts = np.arange(0, len(audio_data), chunk_size)
+    frame_lengths = np.diff(np.append(frame_starts, len(audio_data)))
+    levels = np.add.reduceat(magnitude, frame_starts) / frame_lengths
+    silent = levels < silence_threshold
+
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+    separators = ((run_ends - run_starts) * chunk_size > frame_rate * min_silence) \
+        | (run_starts == 0) | (run_ends == len(silent))
+
+    tone_starts = np.concatenate(([0], run_ends[separators]))
+    tone_ends = np.concatenate((run_starts[separators], [len(silent)]))
+    keep = tone_ends > tone_starts
+    # Silence and noise have no quiet gaps to set the threshold apart from, so a tone
+    # also has to clear the quietest chunks by TONE_CONTRAST
+    tone_levels = np.add.reduceat(levels, np.minimum(tone_starts, len(levels) - 1)) \
+        / np.maximum(tone_ends - tone_starts, 1)
+    keep &= tone_levels > TONE_CONTRAST * np.percentile(levels, 1)
+    segments = np.stack((tone_starts[keep], tone_ends[keep]), axis=1) * chunk_size
+    return np.minimum(segments, len(audio_data))
+
+def split_audio_on_silence(audio_file, chunk_size=128):
+    audio_data, frame_rate = read_wave_file(audio_file)
+    segments = segment_on_silence(audio_data, frame_rate, chunk_size)
+    return segments, audio_data, frame_rate
 
 def check_sine_wave(audio_data, frame_rate, target_freq):
     n = len(audio_data)
@@ -62,10 +88,193 @@ def check_sine_wave(audio_data, frame_rate, target_freq):
     
     return max_correlation
 
+def segment_dtmf_bins(audio_data, segments, rate):
+    # Single-bin DFT (Goertzel) power of all eight DTMF frequencies for every
+    # (start, end) segment of audio_data. The magnitude of a single-bin DFT does not
+    # depend on where the segment starts, so every bin is computed once over the whole
+    # signal and summed per segment with reduceat.
+    segments = np.asarray(segments, dtype=np.int64).reshape(-1, 2)
+    energies = np.zeros((len(segments), len(DTMF_BIN_FREQS)))
+    nonempty = segments[:, 1] > segments[:, 0]
+    if not nonempty.any():
+        return energies
+
+    bounds = segments[nonempty].reshape(-1)
+    samples = np.append(audio_data.astype(np.float64), 0.0)
+    n = np.arange(len(samples))
+    for k, freq in enumerate(DTMF_BIN_FREQS):
+        phase = (2 * np.pi * freq / rate) * n
+        real = np.add.reduceat(samples * np.cos(phase), bounds)[::2]
+        imag = np.add.reduceat(samples * np.sin(phase), bounds)[::2]
+        energies[nonempty, k] = real ** 2 + imag ** 2
+    return energies
+
+def detect_dtmf_bins(frames, rate):
+    # frames is a 2D array (one frame per row) or a sequence of 1D frames of any length
+    if isinstance(frames, np.ndarray) and frames.ndim == 2:
+        lengths = np.full(frames.shape[0], frames.shape[1])
+        samples = frames.reshape(-1)
+    else:
+        frames = [np.asarray(frame) for frame in frames]
+        lengths = np.array([len(frame) for frame in frames], dtype=np.int64)
+        samples = np.concatenate(frames) if frames else np.zeros(0)
+    ends = np.cumsum(lengths)
+    return segment_dtmf_bins(samples, np.stack((ends - lengths, ends), axis=1), rate)
+
+def spectrogram_dtmf_bins(spectrogram, segments):
+    # Like segment_dtmf_bins, from the power of the frames centered inside every segment.
+    # Segments too short to hold a frame center fall back to the single-bin DFT.
+    segments = np.asarray(segments, dtype=np.int64).reshape(-1, 2)
+    energies = spectrogram.segment_sums(spectrogram.bin_magnitudes(DTMF_BIN_FREQS) ** 2, segments)
+    empty = ~energies.any(axis=1)
+    if empty.any():
+        energies[empty] = segment_dtmf_bins(spectrogram.audio, segments[empty], spectrogram.frame_rate)
+    return energies
+
+def dtmf_digits(energies):
+    low = np.argmax(energies[:, :len(DTMF_LOW)], axis=1)
+    high = np.argmax(energies[:, len(DTMF_LOW):], axis=1)
+    return ''.join(DTMF_FREQS[(DTMF_LOW[l], DTMF_HIGH[h])] for l, h in zip(low, high))
+
+class DTMFStreamDecoder:
+    # Decodes DTMF from fixed-size sample blocks with bounded memory.
+    # The silence threshold follows an adaptive noise floor and a decaying peak level
+    # instead of a global mean, and a digit is emitted as soon as its tone has ended.
+    # The first `warmup` seconds are buffered once to estimate the initial noise floor,
+    # and with min_silence=None also the timing, which must then fit two tones in the warmup.
+
+    def __init__(self, frame_rate, chunk_size=None, min_silence=0.02, min_tone=0.01,
+                 warmup=1.0, noise_adapt=0.05, peak_half_life=2.0, contrast=0.3):
+        self.frame_rate = frame_rate
+        self.chunk_size = chunk_size = chunk_size or default_chunk_size(frame_rate)
+        self.min_silence_chunks = None if min_silence is None else frame_rate * min_silence / chunk_size
+        self.timing = None
+        self.min_tone_chunks = frame_rate * min_tone / chunk_size
+        self.warmup_chunks = max(1, int(frame_rate * warmup / chunk_size))
+        self.noise_adapt = noise_adapt
+        self.peak_decay = 0.5 ** (chunk_size / (frame_rate * peak_half_life))
+        self.contrast = contrast
+
+        n = np.arange(chunk_size)
+        self._basis = np.exp(-2j * np.pi * np.outer(n, DTMF_BIN_FREQS) / frame_rate)
+        self._step = 2 * np.pi * DTMF_BIN_FREQS / frame_rate
+        self._remainder = np.zeros(0)
+        self._warmup = []
+        self.noise_floor = None
+        self.peak = 0.0
+        self._reset_tone()
+
+    def _reset_tone(self):
+        self._in_tone = False
+        self._tone_chunks = 0
+        self._silent_chunks = 0
+        self._tone_samples = 0
+        self._acc = np.zeros(len(DTMF_BIN_FREQS), dtype=np.complex128)
+
+    def threshold(self):
+        return max(self.noise_floor + self.contrast * (self.peak - self.noise_floor),
+                   2 * self.noise_floor, 1e-6)
+
+    def feed(self, samples):
+        samples = np.concatenate((self._remainder, np.asarray(samples, dtype=np.float64)))
+        n_chunks = len(samples) // self.chunk_size
+        self._remainder = samples[n_chunks * self.chunk_size:]
+        chunks = samples[:n_chunks * self.chunk_size].reshape(n_chunks, self.chunk_size)
+
+        if self.noise_floor is None:
+            self._warmup.append(chunks)
+            if sum(len(c) for c in self._warmup) < self.warmup_chunks:
+                return ''
+            return self._end_warmup()
+        return self._process(chunks)
+
+    def flush(self):
+        digits = self._end_warmup() if self.noise_floor is None else ''
+        if self._in_tone:
+            digits += self._finish_tone()
+        self._remainder = np.zeros(0)
+        return digits
+
+    def _end_warmup(self):
+        chunks = np.concatenate(self._warmup) if self._warmup else np.zeros((0, self.chunk_size))
+        self._warmup = []
+        if self.min_silence_chunks is None:
+            self.timing = estimate_timing(chunks.ravel(), self.frame_rate)
+            self.min_silence_chunks = self.frame_rate * self.timing.min_silence() / self.chunk_size
+        levels = np.mean(np.abs(chunks), axis=1)
+        self.noise_floor = np.min(levels) if len(levels) else 0.0
+        return self._process(chunks)
+
+    def _process(self, chunks):
+        levels = np.mean(np.abs(chunks), axis=1)
+        digits = ''
+        for chunk, level in zip(chunks, levels):
+            self.peak = max(level, self.peak * self.peak_decay)
+            silent = level <= self.threshold()
+
+            if silent:
+                if level < self.noise_floor:
+                    self.noise_floor = level
+                else:
+                    self.noise_floor += self.noise_adapt * (level - self.noise_floor)
+            if not self._in_tone:
+                if silent:
+                    continue
+                self._in_tone = True
+
+            if silent:
+                self._silent_chunks += 1
+                if self._silent_chunks > self.min_silence_chunks:
+                    digits += self._finish_tone()
+                    continue
+            else:
+                self._silent_chunks = 0
+                self._tone_chunks += 1
+            self._accumulate(chunk)
+        return digits
+
+    def _accumulate(self, chunk):
+        rotation = np.exp(-1j * self._step * self._tone_samples)
+        self._acc += (chunk @ self._basis) * rotation
+        self._tone_samples += len(chunk)
+
+    def _finish_tone(self):
+        if self._tone_chunks < self.min_tone_chunks:
+            self._reset_tone()
+            return ''
+        digit = dtmf_digits(np.abs(self._acc[None, :]) ** 2)
+        self._reset_tone()
+        return digit
+
+def decode_phone_stream(audio_file, block_size=4096, timing=None, target_rate=8000):
+    # audio_file may be a path or a binary file object such as sys.stdin.buffer.
+    # Blocks pass the decimating front-end first unless target_rate is None.
+    # Without a timing it is inferred from the first TIMING_WARMUP seconds, which
+    # delays the first digit accordingly.
+    with wave.open(audio_file, 'rb') as wav_file:
+        n_channels, sample_width = wav_file.getnchannels(), wav_file.getsampwidth()
+        frame_rate = wav_file.getframerate()
+        decimator = Decimator(frame_rate, target_rate, DTMF_BAND) if target_rate else None
+        if timing is None:
+            decoder = DTMFStreamDecoder(decimator.out_rate if decimator else frame_rate,
+                                        min_silence=None, warmup=TIMING_WARMUP)
+        else:
+            decoder = DTMFStreamDecoder(decimator.out_rate if decimator else frame_rate,
+                                        min_silence=timing.min_silence())
+        while True:
+            frames = wav_file.readframes(block_size)
+            if not frames:
+                break
+            block = pcm_samples(frames, sample_width, n_channels)
+            yield from decoder.feed(decimator.process(block) if decimator else block)
+        if decimator:
+            yield from decoder.feed(decimator.flush())
+        yield from decoder.flush()
 
-import matplotlib.pyplot as plt
 
 def plot_audio_chunks(chunks, frame_rate):
+    # Imported here, pyplot alone takes longer to load than decoding a short file
+    import matplotlib.pyplot as plt
     num_chunks = len(chunks)
     plt.plot
     fig, axs = plt.subplots(num_chunks, 1, figsize=(10, 2 * num_chunks))
@@ -83,29 +292,55 @@ def plot_audio_chunks(chunks, frame_rate):
     plt.tight_layout()
     plt.show()
 
-def decode_phone(audio_file):
-    number_notes, frame_rate = split_audio_on_silence(audio_file)
-    phone_number = ''
-
-    # plot_audio_chunks(number_notes, frame_rate)
-    for note in number_notes:
-        max1 = 0
-        max2 = 0
-        freq1 = 0
-        freq2 = 0
-        for freqs1, freqs2 in DTMF_FREQS.keys():
-            correlation = abs(check_sine_wave(note, frame_rate, freqs1))
-            if correlation > max1:
-                max1 = correlation
-                freq1 = freqs1
-            correlation = abs(check_sine_wave(note, frame_rate, freqs2))
-            if correlation > max2:
-                max2 = correlation
-                freq2 = freqs2
-        phone_number += DTMF_FREQS[(freq1, freq2)]
-    return phone_number
+def estimate_timing(audio_data, frame_rate):
+    # Infers tone and gap length from the median tone and silence between tones,
+    # segmenting with the shortest silence that still bridges the beat dips
+    segments = segment_on_silence(audio_data, frame_rate, min_silence=DTMFTiming(0, 0).min_silence())
+    if len(segments) < 2:
+        return DEFAULT_TIMING
+    tone = np.median(segments[:, 1] - segments[:, 0]) / frame_rate
+    gap = np.median(segments[1:, 0] - segments[:-1, 1]) / frame_rate
+    return DTMFTiming(float(tone), float(gap))
+
+def decode_phone_audio(audio_data, frame_rate, timing=None, spectrogram=None):
+    # timing is inferred from the signal unless given. With a Spectrogram of audio_data
+    # (e.g. a cached one) the tone energies are read from it instead of computed again.
+    with stage('segment', samples=len(audio_data)) as segment_stage:
+        if timing is None:
+            timing = estimate_timing(audio_data, frame_rate)
+        segments = segment_on_silence(audio_data, frame_rate, min_silence=timing.min_silence())
+        segment_stage.count(segments=len(segments))
+
+    # plot_audio_chunks([audio_data[start:end] for start, end in segments], frame_rate)
+    with stage('detect', samples=len(audio_data), segments=len(segments)):
+        if spectrogram is None:
+            energies = segment_dtmf_bins(audio_data, segments, frame_rate)
+        else:
+            energies = spectrogram_dtmf_bins(spectrogram, segments)
+    with stage('assemble', segments=len(segments)):
+        return dtmf_digits(energies)
+
+def decode_phone(audio_file, timing=None, target_rate=8000):
+    # Detection runs on the decimated, band-passed signal unless target_rate is None
+    if target_rate:
+        audio_data, frame_rate = read_decimated(audio_file, target_rate, DTMF_BAND)
+    else:
+        audio_data, frame_rate = read_wave_file(audio_file)
+    return decode_phone_audio(audio_data, frame_rate, timing)
+
+def decode_phone_spectrogram(audio_file, timing=None, target_rate=8000):
+    # Reads the tone energies from the STFT of the file instead of a DFT per segment.
+    # The STFT is cached, decoding the same unchanged file again skips reading it.
+    phone_spectrogram = spectrogram(audio_file, DTMF_WINDOW, DTMF_WINDOW // 2, 'hann', DTMF_N_FFT,
+                                    target_rate=target_rate, band=DTMF_BAND)
+    return decode_phone_audio(phone_spectrogram.audio, phone_spectrogram.frame_rate, timing, phone_spectrogram)
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '-':
+        for digit in decode_phone_stream(sys.stdin.buffer):
+            print(digit, end='', flush=True)
+        print()
+        sys.exit()
     audio_file = 'phone_number.wav'
     phone_number = decode_phone(audio_file)
     print(f"Decoded phone number: {phone_number}")
\ No newline at end of file
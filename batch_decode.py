@@ -0,0 +1,103 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import audio_to_phonenumber
+import morse_to_text
+from audio_io import WaveFile, decimate
+from profiling import Profiler, stage
+from text_to_morse import CARRIERS, FREQUENCY as MORSE_FREQUENCY
+
+
+def expand_paths(patterns):
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            files.extend(sorted(glob.glob(os.path.join(pattern, '**', '*.wav'), recursive=True)))
+        else:
+            files.extend(sorted(glob.glob(pattern, recursive=True)) or [pattern])
+    return files
+
+def detect_mode(audio_data, frame_rate, seconds=10, tolerance=20):
+    # DTMF if the eight DTMF frequencies hold more spectral energy than the Morse carrier.
+    # The multi-carrier Morse carriers overlap the DTMF band, so they are told apart by the
+    # carriers that lie clear of every DTMF row and column, where neither DTMF nor
+    # single-carrier Morse puts any energy.
+    audio_data = np.asarray(audio_data[:int(frame_rate * seconds)], dtype=np.float64)
+    if len(audio_data) == 0:
+        return 'dtmf'  # nothing to tell apart, every decoder returns ''
+    power = np.abs(np.fft.rfft(audio_data)) ** 2
+    freqs = np.fft.rfftfreq(len(audio_data), 1 / frame_rate)
+
+    def band_power(center):
+        return np.sum(power[np.abs(freqs - center) < tolerance])
+
+    dtmf = sum(band_power(freq) for freq in audio_to_phonenumber.DTMF_BIN_FREQS)
+    morse = band_power(MORSE_FREQUENCY)
+    clear = [carrier for carrier in CARRIERS if carrier != MORSE_FREQUENCY
+             and np.min(np.abs(audio_to_phonenumber.DTMF_BIN_FREQS - carrier)) > 2 * tolerance]
+    if sum(band_power(carrier) for carrier in clear) > 0.25 * max(dtmf, morse):
+        return 'multicarrier'
+    return 'dtmf' if dtmf > morse else 'morse'
+
+def decode_file(file_path, mode='auto', profile=False):
+    if profile:
+        with Profiler() as profiler:
+            result = decode_file(file_path, mode)
+        result['profile'] = profiler.to_dict()
+        return result
+
+    start = time.perf_counter()
+    result = {'file': file_path, 'mode': mode}
+    try:
+        with stage('read') as read_stage:
+            wave_file = WaveFile(file_path)
+            audio_data, frame_rate = wave_file.read(), wave_file.frame_rate
+            read_stage.count(samples=wave_file.n_frames)
+        result['duration'] = wave_file.n_frames / frame_rate
+        if mode == 'auto':
+            mode = result['mode'] = detect_mode(audio_data, frame_rate)
+        if mode == 'dtmf':
+            audio_data, frame_rate = decimate(audio_data, frame_rate, band=audio_to_phonenumber.DTMF_BAND)
+            result['result'] = audio_to_phonenumber.decode_phone_audio(audio_data, frame_rate)
+        elif mode == 'multicarrier':
+            audio_data, frame_rate = decimate(audio_data, frame_rate)
+            result['result'] = morse_to_text.decode_multicarrier(audio_data, frame_rate)
+        else:
+            audio_data, frame_rate = decimate(audio_data, frame_rate)
+            morse_code = morse_to_text.decode_morse(audio_data, frame_rate)
+            result['result'] = morse_to_text.morse_to_text(morse_code)
+    except Exception as error:
+        result['error'] = f'{type(error).__name__}: {error}'
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def decode_files(files, mode='auto', workers=None, chunksize=None, profile=False):
+    # Yields one result per file, in input order, as soon as it is available
+    workers = workers or os.cpu_count()
+    if chunksize is None:
+        chunksize = max(1, len(files) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(decode_file, files, [mode] * len(files), [profile] * len(files),
+                                chunksize=chunksize)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decode many DTMF or Morse recordings in parallel.")
+    parser.add_argument('paths', nargs='+', help="wave files, directories or glob patterns")
+    parser.add_argument('--mode', choices=('auto', 'dtmf', 'morse', 'multicarrier'), default='auto')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunksize', type=int, default=None)
+    parser.add_argument('--profile', action='store_true', help="add per-stage timings and counts to every result")
+    args = parser.parse_args(argv)
+
+    for result in decode_files(expand_paths(args.paths), args.mode, args.workers, args.chunksize, args.profile):
+        print(json.dumps(result), flush=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
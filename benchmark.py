@@ -0,0 +1,173 @@
+import argparse
+import difflib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from channel import simulate
+
+SAMPLE_RATE = 44100
+LENGTHS = {'dtmf': (16, 128), 'morse': (8, 32)}
+MORSE_ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+
+# Entry points whose start-up time is measured, as python -c 'import module'
+COLD_START_MODULES = ('cli', 'audio_to_phonenumber', 'phonenumber_to_audio', 'morse_to_text',
+                      'text_to_morse', 'pixmap_phone_transcoder', 'fsk_modem')
+
+# Keyword arguments of channel.simulate
+CHANNELS = {
+    'clean': {},
+    'awgn20': {'snr_db': 20},
+    'awgn10': {'snr_db': 10},
+    'awgn5': {'snr_db': 5},
+    'clipped': {'clip_ratio': 0.3, 'snr_db': 20},
+    'drift': {'drift_ppm': 2000, 'snr_db': 20},
+    'level': {'level_db': 10, 'snr_db': 20},
+}
+
+
+def random_payload(mode, length, rng):
+    if mode == 'dtmf':
+        from phonenumber_to_audio import DIGITS
+        return ''.join(rng.choice(list(DIGITS), length))
+    # Words of one to six characters, so the word gaps get exercised too
+    chars = list(rng.choice(list(MORSE_ALPHABET), length))
+    for position in np.cumsum(rng.integers(2, 8, length))[:-1]:
+        if position < len(chars) - 1:
+            chars[position] = ' '
+    return ''.join(chars).strip()
+
+def encode(mode, payload):
+    if mode == 'dtmf':
+        from phonenumber_to_audio import encode_phone_number
+        return encode_phone_number(payload, SAMPLE_RATE), SAMPLE_RATE
+    from text_to_morse import SAMPLE_RATE as MORSE_RATE, generate_morse_audio, text_to_morse
+    return generate_morse_audio(text_to_morse(payload)), MORSE_RATE
+
+def decode(mode, audio_data, frame_rate):
+    # The same front-end as batch_decode
+    from audio_io import decimate
+    if mode == 'dtmf':
+        from audio_to_phonenumber import DTMF_BAND, decode_phone_audio
+        return decode_phone_audio(*decimate(audio_data, frame_rate, band=DTMF_BAND))
+    from morse_to_text import decode_morse, morse_to_text
+    audio_data, frame_rate = decimate(audio_data, frame_rate)
+    return morse_to_text(decode_morse(audio_data, frame_rate))
+
+def symbol_error_rate(sent, received):
+    # Substitutions, insertions and deletions relative to the sent length
+    matcher = difflib.SequenceMatcher(None, sent, received, autojunk=False)
+    errors = sum(max(i2 - i1, j2 - j1) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal')
+    return errors / max(len(sent), 1)
+
+def peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak  # bytes on macOS, KiB elsewhere
+
+def throughput(n_samples, seconds, duration):
+    return {'seconds': seconds, 'samples_per_second': n_samples / seconds if seconds else None,
+            'real_time_factor': seconds / duration if duration else None}
+
+def run_encode(mode, length, channel, seed, audio_path):
+    # Runs in its own process, so the peak RSS belongs to this encoder alone. The channel
+    # output is handed to run_decode through a .npy file.
+    rng = np.random.default_rng(seed)
+    payload = random_payload(mode, length, rng)
+    baseline = peak_rss_kb()
+    start = time.perf_counter()
+    audio_data, frame_rate = encode(mode, payload)
+    seconds = time.perf_counter() - start
+    result = throughput(len(audio_data), seconds, len(audio_data) / frame_rate)
+    result.update(peak_rss_kb=peak_rss_kb(), baseline_rss_kb=baseline)
+
+    np.save(audio_path, simulate(audio_data, frame_rate, rng=rng, **CHANNELS[channel]).astype(np.float32))
+    return payload, frame_rate, len(audio_data) / frame_rate, result
+
+def run_decode(mode, payload, audio_path, frame_rate):
+    audio_data = np.load(audio_path, mmap_mode='r')
+    baseline = peak_rss_kb()
+    start = time.perf_counter()
+    received = decode(mode, audio_data, frame_rate)
+    seconds = time.perf_counter() - start
+    result = throughput(len(audio_data), seconds, len(audio_data) / frame_rate)
+    result.update(peak_rss_kb=peak_rss_kb(), baseline_rss_kb=baseline,
+                  symbol_error_rate=symbol_error_rate(payload, received))
+    return result
+
+def isolated(function, *args):
+    # A fresh worker process per measurement, ru_maxrss never goes down within a process
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(function, *args).result()
+
+def run_case(mode, length, channel, seed=0):
+    with tempfile.TemporaryDirectory() as directory:
+        audio_path = os.path.join(directory, 'received.npy')
+        payload, frame_rate, duration, encoded = isolated(run_encode, mode, length, channel, seed, audio_path)
+        decoded = isolated(run_decode, mode, payload, audio_path, frame_rate)
+    return {'mode': mode, 'length': length, 'channel': channel, 'seed': seed,
+            'audio_seconds': duration, 'encode': encoded, 'decode': decoded}
+
+def cold_start(module, runs=5):
+    # Best of several fresh interpreters, the import cost a short CLI job pays up front
+    directory = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'import ' + module], cwd=directory, check=True)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def run_suite(modes, lengths, channels, seed=0):
+    # Encoding does not depend on the channel, but every case gets its own processes
+    # so the numbers stay comparable when only a subset is run
+    for mode in modes:
+        for length in lengths or LENGTHS[mode]:
+            for channel in channels:
+                yield run_case(mode, length, channel, seed)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the DTMF and Morse encoders and decoders over simulated channels.")
+    parser.add_argument('--modes', nargs='+', choices=sorted(LENGTHS), default=sorted(LENGTHS))
+    parser.add_argument('--lengths', nargs='+', type=int, default=None,
+                        help="payload lengths in symbols (default depends on the mode)")
+    parser.add_argument('--channels', nargs='+', choices=list(CHANNELS), default=list(CHANNELS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cold-start-runs', type=int, default=5,
+                        help="interpreter starts per module for the start-up times, 0 to skip them")
+    parser.add_argument('--output', default=None, help="write the report as JSON to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    cases = []
+    for case in run_suite(args.modes, args.lengths, args.channels, args.seed):
+        print(f"{case['mode']:5} {case['length']:5} {case['channel']:8} "
+              f"encode {case['encode']['real_time_factor']:.4f} x real time  "
+              f"decode {case['decode']['real_time_factor']:.4f} x real time  "
+              f"SER {case['decode']['symbol_error_rate']:.3f}", file=sys.stderr, flush=True)
+        cases.append(case)
+
+    startup = {}
+    if args.cold_start_runs:
+        startup['python'] = cold_start('sys', args.cold_start_runs)
+        for module in COLD_START_MODULES:
+            startup[module] = cold_start(module, args.cold_start_runs)
+            print(f"import {module:24} {startup[module] * 1000:6.0f} ms", file=sys.stderr, flush=True)
+
+    report = {'python': platform.python_version(), 'numpy': np.__version__,
+              'machine': platform.machine(), 'cold_start_seconds': startup, 'cases': cases}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+import numpy as np
+
+# Local stand-in for the audio link between encoder and decoder
+
+
+def add_awgn(signal, snr_db, rng=None):
+    # Additive white Gaussian noise relative to the mean power of the whole signal
+    rng = rng or np.random.default_rng()
+    signal = np.asarray(signal, dtype=np.float64)
+    noise_power = np.mean(signal ** 2) / 10 ** (snr_db / 10)
+    return signal + rng.normal(0, np.sqrt(noise_power), len(signal))
+
+def clip(signal, ratio):
+    # Hard clipping at ratio times the peak amplitude, as from an overdriven input
+    signal = np.asarray(signal, dtype=np.float64)
+    limit = ratio * np.max(np.abs(signal), initial=0)
+    return np.clip(signal, -limit, limit)
+
+def drift(signal, ppm):
+    # Sender and receiver clocks differing by ppm parts per million, resampled linearly
+    signal = np.asarray(signal, dtype=np.float64)
+    positions = np.arange(0, len(signal) - 1, 1 + ppm * 1e-6)
+    return np.interp(positions, np.arange(len(signal)), signal)
+
+def level_changes(signal, sample_rate, depth_db, period=1.0, rng=None):
+    # Gain jumping to a random level within +-depth_db every period seconds,
+    # ramped over 10 ms so the steps do not click
+    rng = rng or np.random.default_rng()
+    signal = np.asarray(signal, dtype=np.float64)
+    step = max(int(sample_rate * period), 1)
+    gains = 10 ** (rng.uniform(-depth_db, depth_db, len(signal) // step + 1) / 20)
+    gain = np.repeat(gains, step)[:len(signal)]
+    ramp = max(int(sample_rate * 0.01), 1)
+    gain = np.convolve(np.pad(gain, (ramp - 1, 0), mode='edge'), np.ones(ramp) / ramp, mode='valid')
+    return signal * gain
+
+def simulate(signal, sample_rate, snr_db=None, clip_ratio=None, drift_ppm=0.0, level_db=0.0, rng=None):
+    # Everything applied in the order of a real link: the clock drifts, the level varies,
+    # the input clips and noise is added last
+    rng = rng or np.random.default_rng()
+    signal = np.asarray(signal, dtype=np.float64)
+    if drift_ppm:
+        signal = drift(signal, drift_ppm)
+    if level_db:
+        signal = level_changes(signal, sample_rate, level_db, rng=rng)
+    if clip_ratio is not None:
+        signal = clip(signal, clip_ratio)
+    if snr_db is not None:
+        signal = add_awgn(signal, snr_db, rng)
+    return signal
@@ -0,0 +1,198 @@
+import argparse
+import sys
+
+# One non-interactive entry point for all codecs:
+#
+#     python cli.py encode dtmf 0123456789 -o phone_number.wav
+#     python cli.py decode morse morse_code.wav
+#     python cli.py encode pixmap image.ppm --codec zlib --transport fsk -o fsk.wav
+#
+# Every command imports only the modules it uses, inside its handler, so a short job
+# does not pay for loading the others (or SciPy and matplotlib, which none of them need).
+
+
+def read_payload(payload):
+    # '-' reads the payload from stdin
+    return sys.stdin.read().strip() if payload == '-' else payload
+
+def timing_from_args(args):
+    from dtmf_timing import DEFAULT_TIMING, DTMFTiming
+    return DTMFTiming(args.tone or DEFAULT_TIMING.tone, args.gap or DEFAULT_TIMING.gap)
+
+def fsk_config_from_args(args, sample_rate):
+    # --tone sets the FSK symbol duration, the symbols follow each other without gaps
+    import fsk_modem
+    if args.gap:
+        sys.exit("error: --gap does not apply to the fsk transport")
+    default = fsk_modem.DEFAULT_CONFIG
+    try:
+        return fsk_modem.FSKConfig(default.tones, args.tone or default.symbol_duration,
+                                   default.base_frequency, sample_rate)
+    except ValueError as error:
+        sys.exit(f"error: {error}")
+
+def read_stdin_decimated():
+    # The whole wave file from stdin through the decimating front-end, for the decoders
+    # that cannot stream. stdin cannot be memory-mapped like a file.
+    import wave
+    from audio_io import decimate, pcm_samples
+    with wave.open(sys.stdin.buffer, 'rb') as wav_file:
+        n_channels, sample_width = wav_file.getnchannels(), wav_file.getsampwidth()
+        frame_rate = wav_file.getframerate()
+        frames = wav_file.readframes(wav_file.getnframes())
+    return decimate(pcm_samples(frames, sample_width, n_channels), frame_rate)
+
+def encode_dtmf(args):
+    from phonenumber_to_audio import digit_indices, stream_to_wav
+    payload = read_payload(args.payload)
+    if len(digit_indices(payload)) == 0:
+        sys.exit("error: the payload holds no DTMF symbols (0-9, A-D, * and #)")
+    stream_to_wav(payload, args.output, args.sample_rate, timing_from_args(args))
+
+def decode_dtmf(args):
+    import audio_to_phonenumber
+    timing = timing_from_args(args) if args.tone or args.gap else None
+    if args.input == '-':
+        # Streaming, digits are printed as soon as their tone ended. Without --tone/--gap
+        # the timing is inferred from the first seconds of the stream.
+        for digit in audio_to_phonenumber.decode_phone_stream(sys.stdin.buffer, timing=timing):
+            print(digit, end='', flush=True)
+        print()
+        return
+    if args.spectrogram:
+        print(audio_to_phonenumber.decode_phone_spectrogram(args.input, timing))
+    else:
+        print(audio_to_phonenumber.decode_phone(args.input, timing))
+
+def encode_morse(args):
+    import text_to_morse
+    text = read_payload(args.payload)
+    if args.multicarrier:
+        audio_data = text_to_morse.generate_multicarrier_audio(text.upper(), sample_rate=args.sample_rate)
+        text_to_morse.save_wave(args.output, audio_data, args.sample_rate)
+    else:
+        text_to_morse.stream_morse_wave(args.output, text_to_morse.text_to_morse(text),
+                                        args.sample_rate, args.ramp)
+
+def decode_morse(args):
+    import morse_to_text
+    if args.input == '-' and not args.multicarrier:
+        for char in morse_to_text.decode_morse_stream(sys.stdin.buffer):
+            print(char, end='', flush=True)
+        print()
+        return
+    if args.input == '-':
+        audio_data, frame_rate = read_stdin_decimated()
+    else:
+        audio_data, frame_rate = morse_to_text.read_decimated(args.input)
+    if args.multicarrier:
+        print(morse_to_text.decode_multicarrier(audio_data, frame_rate))
+    else:
+        print(morse_to_text.morse_to_text(morse_to_text.decode_morse(audio_data, frame_rate)))
+
+def encode_pixmap(args):
+    import pixmap_phone_transcoder as pixmap
+    if args.ascii:
+        encoded = pixmap.encode_pixmap(args.input)
+    else:
+        encoded = pixmap.encode_pixmap_binary(args.input, args.codec)
+    if args.transport == 'fsk':
+        import fsk_modem
+        if len(encoded) % 2:
+            encoded += '#'  # whole bytes; only the ASCII mode is odd, where '#' is a trailing space
+        fsk_modem.save_payload_wav(pixmap.symbols_to_bytes(encoded), args.output,
+                                   fsk_config_from_args(args, args.sample_rate))
+    else:
+        from phonenumber_to_audio import stream_to_wav
+        stream_to_wav(encoded, args.output, args.sample_rate, timing_from_args(args))
+
+def decode_pixmap(args):
+    import pixmap_phone_transcoder as pixmap
+    if args.transport == 'fsk':
+        import fsk_modem
+        # The sample rate is taken from the file
+        config = fsk_config_from_args(args, fsk_modem.DEFAULT_CONFIG.sample_rate)
+        symbols = pixmap.bytes_to_symbols(fsk_modem.decode_payload(args.input, config))
+    else:
+        from audio_to_phonenumber import decode_phone
+        symbols = decode_phone(args.input, timing_from_args(args) if args.tone or args.gap else None)
+    if args.ascii:
+        pixmap.decode_pixmap(symbols, args.output)
+        return
+    try:
+        pixmap.decode_pixmap_binary(symbols, args.output)
+    except ValueError as error:
+        sys.exit(f"error: {error}")
+
+COMMANDS = {
+    ('encode', 'dtmf'): encode_dtmf,
+    ('decode', 'dtmf'): decode_dtmf,
+    ('encode', 'morse'): encode_morse,
+    ('decode', 'morse'): decode_morse,
+    ('encode', 'pixmap'): encode_pixmap,
+    ('decode', 'pixmap'): decode_pixmap,
+}
+
+
+def add_timing_options(parser):
+    parser.add_argument('--tone', type=float, default=None, help="DTMF tone length in seconds")
+    parser.add_argument('--gap', type=float, default=None, help="DTMF gap length in seconds")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Encode and decode data as DTMF or Morse audio.")
+    parser.add_argument('--profile', action='store_true', help="print per-stage timings as JSON to stderr")
+    actions = parser.add_subparsers(dest='action', required=True)
+
+    encode = actions.add_parser('encode').add_subparsers(dest='scheme', required=True)
+    dtmf = encode.add_parser('dtmf', help="phone number or DTMF symbols to audio")
+    dtmf.add_argument('payload', help="symbols from 0-9, A-D, * and #, '-' for stdin")
+    dtmf.add_argument('-o', '--output', default='phone_number.wav')
+    dtmf.add_argument('--sample-rate', type=int, default=44100)
+    add_timing_options(dtmf)
+    morse = encode.add_parser('morse', help="text to Morse audio")
+    morse.add_argument('payload', help="text, '-' for stdin")
+    morse.add_argument('-o', '--output', default='morse_code.wav')
+    morse.add_argument('--sample-rate', type=int, default=44100)
+    morse.add_argument('--ramp', type=float, default=0.0, help="rise and fall time of the tones in seconds")
+    morse.add_argument('--multicarrier', action='store_true', help="send on several carriers at once")
+    pixmap = encode.add_parser('pixmap', help="PNM image to audio")
+    pixmap.add_argument('input', help="P2, P3, P5 or P6 image")
+    pixmap.add_argument('-o', '--output', default='phone_number.wav')
+    pixmap.add_argument('--codec', choices=('none', 'rle', 'zlib'), default='none')
+    pixmap.add_argument('--transport', choices=('dtmf', 'fsk'), default='dtmf',
+                        help="fsk uses --tone as its symbol length")
+    pixmap.add_argument('--ascii', action='store_true', help="the original text encoding of P3 images")
+    pixmap.add_argument('--sample-rate', type=int, default=44100)
+    add_timing_options(pixmap)
+
+    decode = actions.add_parser('decode').add_subparsers(dest='scheme', required=True)
+    dtmf = decode.add_parser('dtmf', help="audio to DTMF symbols")
+    dtmf.add_argument('input', help="wave file, '-' to stream from stdin")
+    dtmf.add_argument('--spectrogram', action='store_true',
+                      help="read the tone energies from an STFT of the file (not for stdin)")
+    add_timing_options(dtmf)
+    morse = decode.add_parser('morse', help="Morse audio to text")
+    morse.add_argument('input', help="wave file, '-' to stream from stdin")
+    morse.add_argument('--multicarrier', action='store_true')
+    pixmap = decode.add_parser('pixmap', help="audio to PNM image")
+    pixmap.add_argument('input', help="wave file")
+    pixmap.add_argument('-o', '--output', default='output.pnm')
+    pixmap.add_argument('--transport', choices=('dtmf', 'fsk'), default='dtmf',
+                        help="fsk uses --tone as its symbol length")
+    pixmap.add_argument('--ascii', action='store_true', help="the original text encoding of P3 images")
+    add_timing_options(pixmap)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    command = COMMANDS[args.action, args.scheme]
+    if not args.profile:
+        return command(args)
+
+    from profiling import Profiler
+    with Profiler() as profiler:
+        command(args)
+    print(profiler.to_json(), file=sys.stderr)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+import zlib
+
+import numpy as np
+
+# Codec ids as sent in the transfer header
+CODECS = ('none', 'rle', 'zlib')
+
+
+def row_delta(data, row_bytes):
+    # Replaces every row by its byte-wise difference to the row above (modulo 256),
+    # so flat regions and vertical edges turn into runs of zeros
+    data = np.frombuffer(data, dtype=np.uint8)
+    n_rows = len(data) // row_bytes
+    rows = data[:n_rows * row_bytes].reshape(n_rows, row_bytes)
+    delta = rows.copy()
+    delta[1:] -= rows[:-1]
+    return delta.tobytes() + data[n_rows * row_bytes:].tobytes()
+
+def rle_encode(data):
+    # PackBits: control byte n < 128 is followed by n + 1 literal bytes,
+    # n > 128 means the next byte repeats 257 - n times
+    data = np.frombuffer(data, dtype=np.uint8)
+    if len(data) == 0:
+        return b''
+    run_starts = np.flatnonzero(np.concatenate(([True], data[1:] != data[:-1])))
+    run_lengths = np.diff(np.append(run_starts, len(data)))
+
+    output = bytearray()
+    literal_start = None
+    for start, length in zip(run_starts.tolist(), run_lengths.tolist()):
+        if length < 3:
+            if literal_start is None:
+                literal_start = start
+            continue
+        if literal_start is not None:
+            _append_literals(output, data[literal_start:start])
+            literal_start = None
+        value = int(data[start])
+        for count in [128] * (length // 128) + [length % 128]:
+            if count >= 2:
+                output += bytes((257 - count, value))
+            elif count == 1:
+                output += bytes((0, value))
+    if literal_start is not None:
+        _append_literals(output, data[literal_start:])
+    return bytes(output)
+
+def _append_literals(output, literals):
+    for start in range(0, len(literals), 128):
+        block = literals[start:start + 128]
+        output.append(len(block) - 1)
+        output += block.tobytes()
+
+def compress(data, codec, row_bytes):
+    if codec == 'none':
+        return bytes(data)
+    if codec == 'rle':
+        return rle_encode(row_delta(data, row_bytes))
+    if codec == 'zlib':
+        return zlib.compress(row_delta(data, row_bytes), 9)
+    raise ValueError("Unknown codec " + codec)
+
+
+class RLEDecompressor:
+    # Streaming PackBits decoder, accepts the compressed data in chunks of any size
+
+    def __init__(self):
+        self._pending = b''
+
+    def decompress(self, data):
+        data = self._pending + data
+        output = bytearray()
+        position = 0
+        while position < len(data):
+            control = data[position]
+            if control < 128:
+                end = position + 1 + control + 1
+                if end > len(data):
+                    break
+                output += data[position + 1:end]
+                position = end
+            elif control > 128:
+                if position + 1 >= len(data):
+                    break
+                output += data[position + 1:position + 2] * (257 - control)
+                position += 2
+            else:
+                position += 1
+        self._pending = data[position:]
+        return bytes(output)
+
+    def flush(self):
+        self._pending = b''
+        return b''
+
+
+class RowDeltaDecoder:
+    # Streaming inverse of row_delta, emits every row as soon as it is complete
+
+    def __init__(self, row_bytes):
+        self.row_bytes = row_bytes
+        self._previous = np.zeros(row_bytes, dtype=np.uint8)
+        self._pending = b''
+
+    def decode(self, data):
+        data = self._pending + data
+        n_rows = len(data) // self.row_bytes
+        self._pending = data[n_rows * self.row_bytes:]
+        if n_rows == 0:
+            return b''
+        delta = np.frombuffer(data[:n_rows * self.row_bytes], dtype=np.uint8).reshape(n_rows, self.row_bytes)
+        rows = np.cumsum(np.vstack((self._previous, delta)), axis=0, dtype=np.uint8)[1:]
+        self._previous = rows[-1]
+        return rows.tobytes()
+
+    def flush(self):
+        pending, self._pending = self._pending, b''
+        return pending
+
+
+class Decompressor:
+    # Streaming decompressor for every codec in CODECS
+
+    def __init__(self, codec, row_bytes):
+        self.codec = codec
+        if codec == 'none':
+            self._inner = None
+        elif codec == 'rle':
+            self._inner = RLEDecompressor()
+        elif codec == 'zlib':
+            self._inner = zlib.decompressobj()
+        else:
+            raise ValueError("Unknown codec " + codec)
+        self._rows = RowDeltaDecoder(row_bytes) if self._inner else None
+
+    def decompress(self, data):
+        if self._inner is None:
+            return bytes(data)
+        return self._rows.decode(self._inner.decompress(data))
+
+    def flush(self):
+        if self._inner is None:
+            return b''
+        return self._rows.decode(self._inner.flush()) + self._rows.flush()
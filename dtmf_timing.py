@@ -0,0 +1,16 @@
+from collections import namedtuple
+
+
+class DTMFTiming(namedtuple('DTMFTiming', 'tone gap')):
+    # Tone and gap length in seconds, shared by the encoder and the decoder
+
+    def min_silence(self):
+        # Silence that separates two tones. Dips of the beating two-tone signal last
+        # only a few milliseconds, so the floor keeps them inside their tone.
+        return max(0.008, self.gap / 2)
+
+    def symbol_rate(self):
+        return 1 / (self.tone + self.gap)
+
+
+DEFAULT_TIMING = DTMFTiming(tone=0.5, gap=0.1)
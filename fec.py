@@ -0,0 +1,190 @@
+import numpy as np
+
+from pixmap_phone_transcoder import NIBBLE_INDEX, NIBBLE_SYMBOLS
+
+# Reed-Solomon over GF(16), so one code symbol is one DTMF symbol (or one hex character in
+# Morse). RS(15, 15 - nsym) corrects nsym / 2 wrong symbols per codeword; the block
+# interleaver spreads a burst of wrong symbols over depth codewords.
+# Lost or extra symbols shift everything after them and can not be repaired.
+
+N = 15
+LENGTH_NIBBLES = 8  # 32-bit payload length in front of the payload
+HEX_SYMBOLS = '0123456789ABCDEF'
+
+# GF(16) with the primitive polynomial x^4 + x + 1
+GF_EXP = np.zeros(2 * N, dtype=np.int64)
+GF_LOG = np.zeros(N + 1, dtype=np.int64)
+_value = 1
+for _power in range(N):
+    GF_EXP[_power] = GF_EXP[_power + N] = _value
+    GF_LOG[_value] = _power
+    _value <<= 1
+    if _value & 0x10:
+        _value ^= 0x13
+
+
+_EXP, _LOG = GF_EXP.tolist(), GF_LOG.tolist()
+
+
+def gf_mul_scalar(a, b):
+    return 0 if a == 0 or b == 0 else _EXP[_LOG[a] + _LOG[b]]
+
+def gf_mul(a, b):
+    # Element-wise product of two arrays (or numbers) of field elements
+    a, b = np.asarray(a), np.asarray(b)
+    product = GF_EXP[(GF_LOG[a] + GF_LOG[b]) % N]
+    return np.where((a == 0) | (b == 0), 0, product)
+
+def gf_div(a, b):
+    return 0 if a == 0 else _EXP[(_LOG[a] - _LOG[b]) % N]
+
+def poly_eval(poly, x):
+    # poly is lowest coefficient first
+    result = 0
+    for coefficient in reversed(poly):
+        result = gf_mul_scalar(result, x) ^ coefficient
+    return result
+
+def generator_poly(nsym):
+    # prod(x - alpha^i) for i < nsym, highest coefficient first
+    poly = np.array([1])
+    for i in range(nsym):
+        poly = np.append(poly, 0) ^ np.append(0, gf_mul(poly, GF_EXP[i]))
+    return poly
+
+def rs_encode(messages, nsym=4):
+    # Systematic encoding of all messages at once: (n_codewords, N - nsym) -> (n_codewords, N)
+    messages = np.asarray(messages, dtype=np.int64)
+    generator = generator_poly(nsym)
+    remainder = np.zeros((len(messages), nsym), dtype=np.int64)
+    for column in messages.T:
+        feedback = column ^ remainder[:, 0]
+        remainder = np.roll(remainder, -1, axis=1)
+        remainder[:, -1] = 0
+        remainder ^= gf_mul(feedback[:, None], generator[None, 1:])
+    return np.hstack((messages, remainder))
+
+def syndromes(codewords, nsym=4):
+    # S_j = c(alpha^j) for every codeword, with the first symbol as the highest power
+    codewords = np.asarray(codewords, dtype=np.int64)
+    exponents = np.outer(np.arange(nsym), np.arange(N - 1, -1, -1))
+    terms = GF_EXP[(GF_LOG[codewords][:, None, :] + exponents[None]) % N]
+    terms[np.broadcast_to((codewords == 0)[:, None, :], terms.shape)] = 0
+    return np.bitwise_xor.reduce(terms, axis=2)
+
+def correct_codeword(codeword, synd):
+    # Berlekamp-Massey, Chien search and Forney for one codeword, None if uncorrectable
+    nsym = len(synd)
+    locator, previous = [1] + [0] * nsym, [1] + [0] * nsym
+    n_errors, shift, scale = 0, 1, 1
+    for n in range(nsym):
+        discrepancy = synd[n]
+        for i in range(1, n_errors + 1):
+            discrepancy ^= gf_mul_scalar(locator[i], synd[n - i])
+        if discrepancy == 0:
+            shift += 1
+            continue
+        factor = gf_div(discrepancy, scale)
+        updated = locator[:]
+        for i in range(nsym + 1 - shift):
+            updated[i + shift] ^= gf_mul_scalar(factor, previous[i])
+        if 2 * n_errors <= n:
+            previous, n_errors, scale, shift = locator, n + 1 - n_errors, discrepancy, 1
+        else:
+            shift += 1
+        locator = updated
+    locator = locator[:n_errors + 1]
+    if 2 * n_errors > nsym:
+        return None
+
+    # Position i holds power N - 1 - i, it is wrong where locator(alpha^-(N - 1 - i)) == 0
+    positions = [i for i in range(N) if poly_eval(locator, _EXP[(i + 1) % N]) == 0]
+    if len(positions) != n_errors:
+        return None
+    evaluator = [0] * nsym
+    for i in range(nsym):
+        for j in range(min(i, n_errors) + 1):
+            evaluator[i] ^= gf_mul_scalar(synd[i - j], locator[j])
+    derivative = [locator[i] if i % 2 else 0 for i in range(1, len(locator))]
+
+    corrected = codeword.copy()
+    for position in positions:
+        x = _EXP[N - 1 - position]
+        x_inverse = _EXP[(position + 1) % N]
+        corrected[position] ^= gf_mul_scalar(x, gf_div(poly_eval(evaluator, x_inverse), poly_eval(derivative, x_inverse)))
+    return corrected
+
+def rs_decode(codewords, nsym=4):
+    # Returns the corrected messages and the number of uncorrectable codewords,
+    # which are passed on unchanged. Only codewords with errors leave NumPy.
+    codewords = np.array(codewords, dtype=np.int64)
+    synd = syndromes(codewords, nsym)
+    failures = 0
+    for index in np.flatnonzero(np.any(synd != 0, axis=1)):
+        corrected = correct_codeword(codewords[index], synd[index].tolist())
+        if corrected is None:
+            failures += 1
+        else:
+            codewords[index] = corrected
+    return codewords[:, :N - nsym], failures
+
+def interleave(codewords, depth):
+    # Sends symbol 0 of depth codewords, then symbol 1 and so on
+    return codewords.reshape(-1, depth, N).transpose(0, 2, 1).reshape(-1)
+
+def deinterleave(symbols, depth):
+    return symbols.reshape(-1, N, depth).transpose(0, 2, 1).reshape(-1, N)
+
+def protect_nibbles(nibbles, nsym=4, depth=8):
+    nibbles = np.asarray(nibbles, dtype=np.int64)
+    length = (len(nibbles) >> (4 * np.arange(LENGTH_NIBBLES - 1, -1, -1))) & 0x0F
+    message = np.concatenate((length, nibbles))
+    k = N - nsym
+    n_codewords = -(-len(message) // (k * depth)) * depth
+    message = np.append(message, np.zeros(n_codewords * k - len(message), dtype=np.int64))
+    return interleave(rs_encode(message.reshape(n_codewords, k), nsym), depth)
+
+def recover_nibbles(symbols, nsym=4, depth=8):
+    # Returns (nibbles, number of uncorrectable codewords)
+    symbols = np.asarray(symbols, dtype=np.int64)
+    block = N * depth
+    size = max(block, -(-len(symbols) // block) * block)
+    symbols = np.append(symbols, np.zeros(size - len(symbols), dtype=np.int64))[:size]
+    messages, failures = rs_decode(deinterleave(symbols, depth), nsym)
+    message = messages.reshape(-1)
+    length = int(np.sum(message[:LENGTH_NIBBLES] << (4 * np.arange(LENGTH_NIBBLES - 1, -1, -1))))
+    return message[LENGTH_NIBBLES:LENGTH_NIBBLES + length], failures
+
+def bytes_to_nibbles(data):
+    data = np.frombuffer(data, dtype=np.uint8).astype(np.int64)
+    return np.stack((data >> 4, data & 0x0F), axis=1).reshape(-1)
+
+def nibbles_to_bytes(nibbles):
+    nibbles = np.asarray(nibbles, dtype=np.uint8)[:len(nibbles) // 2 * 2].reshape(-1, 2)
+    return (nibbles[:, 0] << 4 | nibbles[:, 1]).tobytes()
+
+def protect_dtmf(symbols, nsym=4, depth=8):
+    # DTMF symbol string in, protected DTMF symbol string out
+    nibbles = NIBBLE_INDEX[np.frombuffer(symbols.encode('ascii'), dtype=np.uint8)]
+    if np.any(nibbles < 0):
+        raise ValueError("Symbol outside of the DTMF alphabet")
+    return ''.join(NIBBLE_SYMBOLS[nibble] for nibble in protect_nibbles(nibbles, nsym, depth))
+
+def recover_dtmf(symbols, nsym=4, depth=8):
+    nibbles = np.maximum(NIBBLE_INDEX[np.frombuffer(symbols.encode('ascii'), dtype=np.uint8)], 0)
+    nibbles, failures = recover_nibbles(nibbles, nsym, depth)
+    return ''.join(NIBBLE_SYMBOLS[nibble] for nibble in nibbles), failures
+
+def protect_text(text, nsym=4, depth=8):
+    # Text in, protected hex string out, to be keyed with text_to_morse
+    nibbles = protect_nibbles(bytes_to_nibbles(text.encode('utf-8')), nsym, depth)
+    return ''.join(HEX_SYMBOLS[nibble] for nibble in nibbles)
+
+def recover_morse(morse_code, nsym=4, depth=8):
+    # Takes the raw code from decode_morse, so an unknown character stays in place
+    # as a wrong symbol instead of being dropped like in morse_to_text
+    from morse_to_text import MORSE_CODE_DICT
+    chars = [MORSE_CODE_DICT.get(code, '0') for code in morse_code.split()]
+    nibbles = [HEX_SYMBOLS.index(char) if char in HEX_SYMBOLS else 0 for char in chars]
+    nibbles, failures = recover_nibbles(nibbles, nsym, depth)
+    return nibbles_to_bytes(nibbles).decode('utf-8', errors='replace'), failures
@@ -0,0 +1,121 @@
+import sys
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+from audio_io import WaveWriter, read_wave_file
+from text_to_morse import generate_tone
+
+# M-ary FSK: every symbol is one of M tones spaced exactly one DFT bin (1 / symbol_duration)
+# apart, so one rfft over each symbol frame separates all tones. A known preamble marks the
+# start, followed by the payload length (32 bits) and the payload itself.
+
+HEADER_BITS = 32
+PREAMBLE_LENGTH = 16
+TONE_PEAK = 0.5  # amplitude of text_to_morse.generate_tone
+
+
+class FSKConfig(namedtuple('FSKConfig', 'tones symbol_duration base_frequency sample_rate')):
+
+    def __new__(cls, tones, symbol_duration, base_frequency, sample_rate):
+        config = super().__new__(cls, tones, symbol_duration, base_frequency, sample_rate)
+        if tones < 2 or tones & (tones - 1):
+            raise ValueError(f"tones must be a power of two, got {tones}")
+        if config.symbol_samples() < 1:
+            raise ValueError(f"symbol_duration {symbol_duration} s is shorter than one sample")
+        top = config.frequencies()[-1]
+        if top >= sample_rate / 2:
+            raise ValueError(f"Highest tone at {top:.0f} Hz is not below the Nyquist frequency "
+                             f"of {sample_rate / 2:.0f} Hz")
+        return config
+
+    def symbol_samples(self):
+        return int(self.sample_rate * self.symbol_duration)
+
+    def bits_per_symbol(self):
+        return int(np.log2(self.tones))
+
+    def first_bin(self):
+        return int(round(self.base_frequency / self.sample_rate * self.symbol_samples()))
+
+    def frequencies(self):
+        # Bin-centered tone frequencies
+        return (self.first_bin() + np.arange(self.tones)) * self.sample_rate / self.symbol_samples()
+
+
+DEFAULT_CONFIG = FSKConfig(tones=64, symbol_duration=0.01, base_frequency=1000, sample_rate=44100)
+
+
+@lru_cache(maxsize=None)
+def fsk_tone_table(config):
+    table = np.stack([generate_tone(frequency, config.symbol_samples() / config.sample_rate, config.sample_rate)
+                      for frequency in config.frequencies()]).astype(np.float32)
+    table.flags.writeable = False
+    return table
+
+@lru_cache(maxsize=None)
+def preamble_symbols(config):
+    return np.random.default_rng(1234).integers(0, config.tones, PREAMBLE_LENGTH)
+
+def bytes_to_symbols(data, bits_per_symbol):
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+    bits = np.append(bits, np.zeros(-len(bits) % bits_per_symbol, dtype=np.uint8))
+    return bits.reshape(-1, bits_per_symbol) @ (1 << np.arange(bits_per_symbol - 1, -1, -1))
+
+def symbols_to_bytes(symbols, bits_per_symbol):
+    bits = (np.asarray(symbols)[:, None] >> np.arange(bits_per_symbol - 1, -1, -1)) & 1
+    return np.packbits(bits.reshape(-1).astype(np.uint8)).tobytes()
+
+def encode_payload(data, config=DEFAULT_CONFIG):
+    # Header and payload are padded to whole symbols separately
+    header = len(data).to_bytes(HEADER_BITS // 8, 'big')
+    symbols = np.concatenate((preamble_symbols(config), bytes_to_symbols(header, config.bits_per_symbol()),
+                              bytes_to_symbols(bytes(data), config.bits_per_symbol())))
+    return fsk_tone_table(config)[symbols].reshape(-1)
+
+def save_payload_wav(data, filename, config=DEFAULT_CONFIG):
+    with WaveWriter(filename, config.sample_rate, peak=TONE_PEAK) as writer:
+        writer.write(encode_payload(data, config))
+
+def find_preamble(audio_data, config=DEFAULT_CONFIG, search_seconds=5.0):
+    # Sample index where the preamble starts, by FFT cross-correlation normalized to the
+    # local signal energy, searched in the first search_seconds only
+    preamble = fsk_tone_table(config)[preamble_symbols(config)].reshape(-1).astype(np.float64)
+    window = np.asarray(audio_data[:int(config.sample_rate * search_seconds) + len(preamble)], dtype=np.float64)
+    if len(window) < len(preamble):
+        raise ValueError("Recording is shorter than the preamble")
+    n_fft = 1 << int(np.ceil(np.log2(len(window) + len(preamble))))
+    correlation = np.fft.irfft(np.fft.rfft(window, n_fft) * np.conj(np.fft.rfft(preamble, n_fft)), n_fft)
+    correlation = correlation[:len(window) - len(preamble) + 1]
+    energy = np.cumsum(np.concatenate(([0.0], window ** 2)))
+    local_energy = energy[len(preamble):] - energy[:-len(preamble)]
+    return int(np.argmax(correlation / np.sqrt(local_energy + 1e-12)))
+
+def demodulate(audio_data, config=DEFAULT_CONFIG):
+    # Every symbol after the preamble as one row of a frame matrix, all decoded in one rfft call
+    n = config.symbol_samples()
+    start = find_preamble(audio_data, config) + PREAMBLE_LENGTH * n
+    n_symbols = (len(audio_data) - start) // n
+    frames = np.asarray(audio_data[start:start + n_symbols * n]).reshape(n_symbols, n)
+    spectrum = np.abs(np.fft.rfft(frames, axis=1))
+    return np.argmax(spectrum[:, config.first_bin():config.first_bin() + config.tones], axis=1)
+
+def decode_payload_audio(audio_data, config=DEFAULT_CONFIG):
+    bits_per_symbol = config.bits_per_symbol()
+    header_symbols = -(-HEADER_BITS // bits_per_symbol)
+    symbols = demodulate(audio_data, config)
+    length = int.from_bytes(symbols_to_bytes(symbols[:header_symbols], bits_per_symbol)[:HEADER_BITS // 8], 'big')
+    return symbols_to_bytes(symbols[header_symbols:], bits_per_symbol)[:length]
+
+def decode_payload(audio_file, config=DEFAULT_CONFIG):
+    audio_data, frame_rate = read_wave_file(audio_file)
+    # Built anew rather than with _replace, so the file's rate is validated as well
+    return decode_payload_audio(audio_data, FSKConfig(config.tones, config.symbol_duration,
+                                                      config.base_frequency, frame_rate))
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'decode':
+        sys.stdout.buffer.write(decode_payload(sys.argv[2] if len(sys.argv) > 2 else 'fsk.wav'))
+    else:
+        save_payload_wav(sys.stdin.buffer.read(), 'fsk.wav')
@@ -1,5 +1,10 @@
 import numpy as np
 import wave
+from collections import deque
+from audio_io import Decimator, pcm_samples, read_decimated
+from profiling import stage
+from spectrogram import Spectrogram
+from text_to_morse import CARRIERS, DOT_DURATION, MULTICARRIER_SPACE_CODE
 
 # Morse code dictionary
 MORSE_CODE_DICT = {
@@ -12,59 +17,324 @@ MORSE_CODE_DICT = {
     '---..': '8', '----.': '9'
 }
 
-def read_wave_file(file_path):
-    with wave.open(file_path, 'r') as wav_file:
-        frames = wav_file.readframes(-1)
-        frame_rate = wav_file.getframerate()
-        audio_data = np.frombuffer(frames, dtype=np.int16)
-    return audio_data, frame_rate
-
-def decode_morse(audio_data, frame_rate):
-    threshold = np.max(audio_data) * 0.5
-    frame_size = int(frame_rate/500)
-    morse_code = ''
-    counter = 0
-    silence = True
-
-    for i in range(0, len(audio_data)-frame_size, frame_size):
-        sample = np.mean(np.abs(audio_data[i:i+frame_size]))
-        if sample < threshold and silence:
-            counter += frame_size
-        elif sample < threshold:
-            silence = True
-            if counter > frame_rate * 0.2:
-                morse_code += "-"
-            elif counter > frame_rate *0.05:
-                morse_code += "."
-            else:
-                print("unrecognized tone")
-            counter = frame_size
-        elif sample >= threshold and not silence:
-            counter += frame_size
+# Ratio of the tone to the silence level of the envelope. Noise alone reaches about 2,
+# a tone at 0 dB SNR about 6.
+MORSE_CONTRAST = 3
+
+def morse_envelope(audio_data, frame_rate):
+    # Mean magnitude of consecutive frames of 2 ms, computed in one pass
+    frame_size = max(1, int(frame_rate / 500))
+    n_frames = len(audio_data) // frame_size
+    frames = audio_data[:n_frames * frame_size].reshape(n_frames, frame_size)
+    return np.mean(np.abs(frames.astype(np.float32)), axis=1), frame_size
+
+def envelope_threshold(envelope, tone_percentile=95):
+    # Halfway between the silence and tone levels. Percentiles instead of np.max
+    # keep single clicks from pulling the threshold up.
+    low, high = np.percentile(envelope, [5, tone_percentile])
+    return (low + high) / 2
+
+def has_contrast(envelope, min_contrast=MORSE_CONTRAST):
+    # False for silence and noise, where no tone stands out of the envelope
+    low, high = np.percentile(envelope, [5, 95])
+    return high > min_contrast * low
+
+def run_lengths(keyed):
+    # Returns (starts, ends) of the runs of True in a boolean array
+    edges = np.diff(np.concatenate(([0], keyed.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+def debounce(keyed, min_frames=2):
+    # Drops on and off runs shorter than min_frames, e.g. clicks and beat dips
+    for value in (True, False):
+        starts, ends = run_lengths(keyed == value)
+        short = ends - starts < min_frames
+        if value is False:
+            short &= (starts > 0) & (ends < len(keyed))
+        fill = np.zeros(len(keyed) + 1, dtype=np.int32)
+        np.add.at(fill, starts[short], 1)
+        np.add.at(fill, ends[short], -1)
+        flip = np.cumsum(fill[:-1]) > 0
+        keyed = np.where(flip, not value, keyed)
+    return keyed
+
+def estimate_dot_frames(on_lengths, off_lengths, default=None):
+    # Dots and the gaps inside a character both last one unit, so the lowest cluster of
+    # the run-length distribution is the dot length. This adapts to any keying speed (WPM).
+    lengths = np.concatenate((on_lengths, off_lengths))
+    shortest = np.percentile(lengths, 10)
+    dot_frames = np.median(lengths[lengths < 2 * shortest])
+    if len(on_lengths) == 0 or dot_frames <= 0.5 * np.max(on_lengths):
+        return dot_frames
+    # All on-runs last about as long, so they are either all dots or all dashes ('TT').
+    # A gap inside a character is shorter than dashes, a gap between characters of
+    # dots is longer than them; anything else is ambiguous and falls back to default.
+    longest = np.max(on_lengths)
+    if len(off_lengths):
+        shortest_off = np.min(off_lengths)
+        if shortest_off <= 0.5 * longest:
+            return np.median(off_lengths[off_lengths < 2 * shortest_off])
+        if shortest_off >= 2 * longest:
+            return dot_frames
+    return dot_frames if default is None else default
+
+def classify_runs(starts, ends, dot_frames):
+    # Turns on-runs into Morse code with ' ' between characters and '   ' between words
+    if len(starts) == 0:
+        return ''
+    symbols = np.where(ends - starts < 2 * dot_frames, '.', '-').astype(object)
+    gaps = starts[1:] - ends[:-1]
+    gap_symbols = np.select([gaps < 2 * dot_frames, gaps < 5 * dot_frames], ['', ' '], '   ')
+
+    parts = np.empty(2 * len(symbols) - 1, dtype=object)
+    parts[0::2] = symbols
+    parts[1::2] = gap_symbols
+    return ''.join(parts)
+
+def decode_morse(audio_data, frame_rate, dot_duration=None):
+    with stage('detect', samples=len(audio_data)):
+        envelope, frame_size = morse_envelope(audio_data, frame_rate)
+    if len(envelope) == 0 or not has_contrast(envelope):
+        return ''
+    with stage('segment', samples=len(audio_data)) as segment_stage:
+        keyed = debounce(envelope >= envelope_threshold(envelope))
+        starts, ends = run_lengths(keyed)
+        segment_stage.count(segments=len(starts))
+    if len(starts) == 0:
+        return ''
+
+    with stage('assemble', segments=len(starts)):
+        if dot_duration is None:
+            dot_frames = estimate_dot_frames(ends - starts, starts[1:] - ends[:-1],
+                                             DOT_DURATION * frame_rate / frame_size)
         else:
-            silence = False
-            if counter > frame_rate * 1.5: # word break
-                morse_code += "   "
-            elif counter > frame_rate *0.4: # char finished
-                morse_code += " "
-            else:
-                pass
-                #print("unrecognized silence")
-            counter = frame_size
-
-    return morse_code
+            dot_frames = dot_duration * frame_rate / frame_size
+        return classify_runs(starts, ends, dot_frames)
+
+# Ratio of tone to noise level in a carrier bin. The bin magnitude of pure noise is Rayleigh
+# distributed, its 99.9th percentile reaches about 8 times its 10th percentile.
+MULTICARRIER_CONTRAST = 10
+
+def carrier_spectrogram(audio_data, frame_rate, spacing=200):
+    # Frames of 2 / spacing seconds with 50% overlap: the bins fall on the carriers and the
+    # rectangular window puts its nulls exactly on the neighbouring carriers
+    frame_size = int(round(2 * frame_rate / spacing))
+    return Spectrogram(audio_data, frame_rate, frame_size, frame_size // 2, 'rect')
+
+def carrier_envelopes(audio_data, frame_rate, carriers, spacing=200, spectrogram=None):
+    # Magnitude of every carrier per frame, (n_frames, n_carriers), and the hop size
+    spectrogram = spectrogram or carrier_spectrogram(audio_data, frame_rate, spacing)
+    return spectrogram.bin_magnitudes(carriers), spectrogram.hop_size
+
+def decode_multicarrier(audio_data, frame_rate, carriers=CARRIERS, dot_duration=None):
+    with stage('detect', samples=len(audio_data)):
+        envelopes, hop = carrier_envelopes(audio_data, frame_rate, carriers)
+    if len(envelopes) == 0:
+        return ''
+    # A carrier is in use if it reaches half the strongest carrier's level for longer than
+    # a glitch; a percentile would miss a carrier that keys a single dot in the transmission.
+    # Both have to clear the noise level of the bins by MULTICARRIER_CONTRAST.
+    noise, peak = np.percentile(envelopes, [10, 99.9])
+    if peak <= MULTICARRIER_CONTRAST * noise:
+        return ''  # silence or noise only
+    keyed_frames = np.sum(envelopes >= max(0.5 * peak, MULTICARRIER_CONTRAST * noise), axis=0)
+
+    runs = []
+    with stage('segment', samples=len(audio_data)) as segment_stage:
+        for envelope, n_keyed in zip(envelopes.T, keyed_frames):
+            if n_keyed < 3:
+                runs.append(None)  # idle carrier, the text was shorter than the carrier count
+                continue
+            # Sparse carriers are keyed for less than 5% of the time
+            runs.append(run_lengths(debounce(envelope >= envelope_threshold(envelope, 99.9))))
+            segment_stage.count(segments=len(runs[-1][0]))
+
+    active = [carrier_runs for carrier_runs in runs if carrier_runs is not None]
+    if not active:
+        return ''
+    with stage('assemble'):
+        if dot_duration is None:
+            # All carriers share the keying speed, so the runs of all of them are pooled:
+            # a carrier that only sent dashes has no dot of its own to measure
+            dot_frames = estimate_dot_frames(np.concatenate([ends - starts for starts, ends in active]),
+                                             np.concatenate([starts[1:] - ends[:-1] for starts, ends in active]),
+                                             DOT_DURATION * frame_rate / hop)
+        else:
+            dot_frames = dot_duration * frame_rate / hop
+
+        stripes = []
+        for carrier_runs in runs:
+            if carrier_runs is None:
+                stripes.append([])
+                continue
+            starts, ends = carrier_runs
+            stripes.append([' ' if code == MULTICARRIER_SPACE_CODE else MORSE_CODE_DICT.get(code, '')
+                            for code in classify_runs(starts, ends, dot_frames).split()])
+
+        # Reassemble the characters in the round-robin order they were striped in
+        chars = []
+        for row in range(max(len(stripe) for stripe in stripes)):
+            chars.extend(stripe[row] for stripe in stripes if row < len(stripe))
+        return ''.join(chars)
 
 def morse_to_text(morse_code):
-    words = morse_code.split('   ')
-    decoded_message = ''
-    for word in words:
-        for char in word.split():
-            decoded_message += MORSE_CODE_DICT.get(char, '')
-        decoded_message += ' '
-    return decoded_message.strip()
+    with stage('assemble'):
+        words = morse_code.split('   ')
+        decoded_message = ''
+        for word in words:
+            for char in word.split():
+                decoded_message += MORSE_CODE_DICT.get(char, '')
+            decoded_message += ' '
+        return decoded_message.strip()
+
+
+
+class MorseStreamDecoder:
+    # Decodes Morse from blocks of samples, emitting every character as soon as the
+    # pause after it is long enough to end it. Like DTMFStreamDecoder, the key threshold
+    # follows an adaptive noise floor and a decaying peak, seeded from `warmup` seconds.
+    # Without dot_duration the dot length is estimated from the last runs; characters
+    # are held back until min_runs runs have been seen.
+
+    def __init__(self, frame_rate, dot_duration=None, warmup=1.0, noise_adapt=0.05,
+                 peak_half_life=2.0, contrast=0.5, min_frames=2, min_runs=8):
+        self.frame_size = max(1, int(frame_rate / 500))  # 2 ms as in morse_envelope
+        self.dot_frames = dot_duration * frame_rate / self.frame_size if dot_duration else None
+        self._estimate_dot = dot_duration is None
+        self.default_dot_frames = DOT_DURATION * frame_rate / self.frame_size
+        self.warmup_frames = max(1, int(frame_rate * warmup / self.frame_size))
+        self.noise_adapt = noise_adapt
+        self.peak_decay = 0.5 ** (self.frame_size / (frame_rate * peak_half_life))
+        self.contrast = contrast
+        self.min_frames = min_frames
+        self.min_runs = min_runs
+
+        self._remainder = np.zeros(0)
+        self._warmup = []
+        self.noise_floor = None
+        self.peak = 0.0
+        self._keyed = False
+        self._run = 0  # frames since the last change of the key state
+        self._flip = 0  # consecutive frames disagreeing with the key state
+        self._on_runs = deque(maxlen=256)
+        self._off_runs = deque(maxlen=256)
+        self._held = []  # runs waiting for a dot length estimate
+        self._symbols = ''
+        self._space = False
+        self._started = False
+
+    def feed(self, samples):
+        samples = np.concatenate((self._remainder, np.asarray(samples, dtype=np.float64)))
+        n_frames = len(samples) // self.frame_size
+        self._remainder = samples[n_frames * self.frame_size:]
+        levels = np.mean(np.abs(samples[:n_frames * self.frame_size].reshape(n_frames, self.frame_size)), axis=1)
+
+        if self.noise_floor is None:
+            self._warmup.append(levels)
+            if sum(len(l) for l in self._warmup) < self.warmup_frames:
+                return ''
+            return self._end_warmup()
+        return self._process(levels)
+
+    def flush(self):
+        text = self._end_warmup() if self.noise_floor is None else ''
+        text += self._end_run(self._keyed, self._run)
+        if self.dot_frames is None and self._on_runs:
+            self._update_dot(force=True)
+            text += self._release()
+        text += self._end_character()
+        self._remainder = np.zeros(0)
+        self._run = self._flip = 0
+        self._keyed = False
+        return text
+
+    def _end_warmup(self):
+        levels = np.concatenate(self._warmup) if self._warmup else np.zeros(0)
+        self._warmup = []
+        # A low percentile rather than the minimum, 2 ms frames of noise alone vary a lot
+        self.noise_floor = np.percentile(levels, 10) if len(levels) else 0.0
+        return self._process(levels)
+
+    def _process(self, levels):
+        text = ''
+        for level in levels:
+            self.peak = max(level, self.peak * self.peak_decay)
+            keyed = level > max(self.noise_floor + self.contrast * (self.peak - self.noise_floor),
+                                2 * self.noise_floor, 1e-6)
+            if not keyed:
+                # Symmetric, unlike the DTMF decoder: following every dip of 2 ms frames
+                # would pull the floor well below the mean noise level
+                self.noise_floor += self.noise_adapt * (level - self.noise_floor)
+
+            # Debounced like debounce(): the state only changes after min_frames frames
+            self._run += 1
+            self._flip = self._flip + 1 if keyed != self._keyed else 0
+            if self._flip >= self.min_frames:
+                text += self._end_run(self._keyed, self._run - self._flip)
+                self._keyed, self._run, self._flip = keyed, self._flip, 0
+            elif not self._keyed and self._symbols and self.dot_frames and self._run >= 2 * self.dot_frames:
+                text += self._end_character()
+        return text
+
+    def _end_run(self, keyed, length):
+        if length == 0 or (not keyed and not self._on_runs and not self._held):
+            return ''  # leading silence
+        (self._on_runs if keyed else self._off_runs).append(length)
+        if self._estimate_dot:
+            self._update_dot()
+        if self.dot_frames is None:
+            self._held.append((keyed, length))
+            return ''
+        return self._release() + self._classify(keyed, length)
+
+    def _update_dot(self, force=False):
+        if force or len(self._on_runs) + len(self._off_runs) >= self.min_runs:
+            self.dot_frames = estimate_dot_frames(np.array(self._on_runs), np.array(self._off_runs),
+                                                  self.default_dot_frames)
+
+    def _release(self):
+        held, self._held = self._held, []
+        return ''.join(self._classify(keyed, length) for keyed, length in held)
+
+    def _classify(self, keyed, length):
+        # Same thresholds as classify_runs
+        if keyed:
+            self._symbols += '.' if length < 2 * self.dot_frames else '-'
+            return ''
+        text = self._end_character() if length >= 2 * self.dot_frames else ''
+        self._space = self._space or length >= 5 * self.dot_frames
+        return text
+
+    def _end_character(self):
+        if not self._symbols:
+            return ''
+        char = MORSE_CODE_DICT.get(self._symbols, '')
+        self._symbols = ''
+        # A word gap only becomes a space once the next character follows it
+        text = ' ' + char if self._space and self._started else char
+        self._space = False
+        self._started = True
+        return text
+
+def decode_morse_stream(audio_file, block_size=4096, dot_duration=None, target_rate=8000):
+    # audio_file may be a path or a binary file object such as sys.stdin.buffer
+    with wave.open(audio_file, 'rb') as wav_file:
+        n_channels, sample_width = wav_file.getnchannels(), wav_file.getsampwidth()
+        frame_rate = wav_file.getframerate()
+        decimator = Decimator(frame_rate, target_rate) if target_rate else None
+        decoder = MorseStreamDecoder(decimator.out_rate if decimator else frame_rate, dot_duration)
+        while True:
+            frames = wav_file.readframes(block_size)
+            if not frames:
+                break
+            block = pcm_samples(frames, sample_width, n_channels)
+            yield from decoder.feed(decimator.process(block) if decimator else block)
+        if decimator:
+            yield from decoder.feed(decimator.flush())
+        yield from decoder.flush()
 
 if __name__ == "__main__":
-    audio_data, frame_rate = read_wave_file('morse_code.wav')
+    audio_data, frame_rate = read_decimated('morse_code.wav')
     morse_code = decode_morse(audio_data, frame_rate)
     decoded_message = morse_to_text(morse_code)
     print(decoded_message)
\ No newline at end of file
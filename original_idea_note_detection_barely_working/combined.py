@@ -2,76 +2,18 @@ import numpy as np
 import wave
 import struct
 import os
+import sys
 import matplotlib.pyplot as plt
 
-def read_wave_file(file_path):
-    with wave.open(file_path, 'rb') as wave_file:
-        n_channels = wave_file.getnchannels()
-        sample_width = wave_file.getsampwidth()
-        frame_rate = wave_file.getframerate()
-        n_frames = wave_file.getnframes()
-        frames = wave_file.readframes(n_frames)
-        
-        if sample_width == 1:
-            dtype = np.uint8  # 8-bit audio
-        elif sample_width == 2:
-            dtype = np.int16  # 16-bit audio
-        else:
-            raise ValueError("Unsupported sample width")
-        
-        audio_data = np.frombuffer(frames, dtype=dtype)
-        if n_channels > 1:
-            audio_data = audio_data.reshape(-1, n_channels)
-            audio_data = audio_data.mean(axis=1)  # Average the channels to get a 1D array
-        
-        return audio_data, frame_rate, wave_file.getparams()
-
-def detect_notes(waveform, frame_size=512, hop_size=256, threshold=1.5):
-    mean = np.mean(np.abs(waveform))
-
-    notes = []
-    start_index = None
-
-    for i in range(0, len(waveform) - frame_size, hop_size):
-        frame = waveform[i:i + frame_size]
-        frame_mean = np.mean(np.abs(frame))
-
-        if frame_mean > threshold*mean and start_index is None:
-            start_index = i
-        elif frame_mean <= threshold*mean and start_index is not None:
-            end_index = i
-            notes.append((start_index, end_index))
-            start_index = None
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from audio_io import WaveFile
+from onsets import detect_onsets_flux
+from pitch import frequency_to_abc, note_frequency
+from templates import TemplateBank
 
-    if start_index is not None:
-        notes.append((start_index, len(waveform)))
-    return notes
-
-
-def detect_notes_with_std(waveform, frame_size=32, hop_size=16, std_factor=2):
-    mean = np.mean(np.abs(waveform))
-    std = np.std(np.abs(waveform))
-
-    notes = []
-    start_index = 0
-    flag = False
-
-    for i in range(0, len(waveform) - frame_size, hop_size):
-        frame = waveform[i:i + frame_size]
-        frame_mean = np.mean(np.abs(frame))
-
-        if frame_mean > mean + std_factor * std and not flag:
-            flag = True
-            if start_index != 0:
-                notes.append((start_index, i-1))
-            start_index = i
-        elif frame_mean > mean + std_factor * std:
-            pass
-        else:
-            flag = False
-
-    print(notes)
-    return notes
+def read_wave_file(file_path):
+    wave_file = WaveFile(file_path)
+    return wave_file.mono(), wave_file.frame_rate, wave_file.params  # Average the channels to get a 1D array
 
 def save_wave_file(file_path, params, wave_data):
     with wave.open(file_path, 'w') as wav_file:
@@ -114,29 +56,25 @@ if __name__ == "__main__":
         wave_data = wave_data[::params.nchannels]
         params = params._replace(nchannels=1)
 
+    # Loaded once instead of once per note and template
+    templates = TemplateBank("piano/Piano.ff.*.wav")
+
     abc_notation = []
     i = 0
-    for start_index, end_index in detect_notes_with_std(wave_data):
+    # A note lasts from its onset to the next one, the last one to the end of the song
+    bounds = np.append(detect_onsets_flux(wave_data), len(wave_data))
+    for start_index, end_index in zip(bounds[:-1], bounds[1:]):
         print(f'Note {i+1}: {start_index} - {end_index}')
         i +=1
         note_data = wave_data[start_index:end_index]
         output_file = os.path.join(output_dir, f'note_{i+1}.wav')
         save_wave_file(output_file, params, note_data)
         
-        # Find the dominant frequency of the note
-        max_correlation = 0
-        dominant_freq = 0
-        #frequencies = np.linspace(300, 600, 100)
-        frequencies = ["piano/Piano.ff.A1.wav", "piano/Piano.ff.B1.wav", "piano/Piano.ff.C1.wav", "piano/Piano.ff.D1.wav", "piano/Piano.ff.E1.wav", "piano/Piano.ff.F1.wav", "piano/Piano.ff.G1.wav"]
-        for freq in frequencies:
-            #correlation = check_sine_wave(note_data, frame_rate, freq)
-            correlation = correlate(note_data, frame_rate, freq)
-            if correlation > max_correlation:
-                max_correlation = correlation
-                dominant_freq = freq
+        # Find the best matching piano template of the note
+        best_template = templates.best(note_data, frame_rate)
         
-        # Convert the dominant frequency to ABC notation
-        abc_note = frequency_to_abc(dominant_freq)
+        # Template names are note names such as A1, convert the note's frequency to ABC notation
+        abc_note = frequency_to_abc(note_frequency(best_template))
         abc_notation.append(abc_note)
     
 
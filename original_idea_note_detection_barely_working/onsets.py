@@ -0,0 +1,33 @@
+import numpy as np
+
+from spectrogram import Spectrogram
+
+# Onset detection from the spectral flux on strided frame views, replacing the per-frame
+# Python loops and fixed energy thresholds of the prototypes. Returns sample indices.
+
+def spectral_flux(audio_data, frame_size=2048, hop_size=512, spectrogram=None):
+    # Sum of the positive magnitude changes between consecutive Hann-windowed frames.
+    # A Spectrogram of the recording that is already at hand is used instead of a new one.
+    spectrogram = spectrogram or Spectrogram(audio_data, 1, frame_size, hop_size)
+    flux = np.sum(np.maximum(np.diff(spectrogram.magnitude, axis=0), 0), axis=1)
+    return np.concatenate(([0.0], flux))
+
+def pick_peaks(novelty, window=8, delta=0.1):
+    # Frames that are the maximum of their neighbourhood and exceed its mean by delta
+    # times the overall standard deviation
+    if len(novelty) == 0:
+        return np.zeros(0, dtype=np.int64)
+    padded = np.pad(novelty, window, mode='edge')
+    neighbourhood = np.lib.stride_tricks.sliding_window_view(padded, 2 * window + 1)
+    is_peak = (novelty == neighbourhood.max(axis=1)) \
+        & (novelty >= neighbourhood.mean(axis=1) + delta * np.std(novelty)) & (novelty > 0)
+    peaks = np.flatnonzero(is_peak)
+    # A flat top gives several equal maxima, keep the first one
+    return peaks[np.concatenate(([True], np.diff(peaks) > window))] if len(peaks) else peaks
+
+def detect_onsets_flux(audio_data, frame_size=2048, hop_size=512, window=8, delta=0.1, spectrogram=None):
+    # Sample index of the center of every onset frame
+    if spectrogram is not None:
+        frame_size, hop_size = spectrogram.window_size, spectrogram.hop_size
+    flux = spectral_flux(audio_data, frame_size, hop_size, spectrogram)
+    return pick_peaks(flux, window, delta) * hop_size + frame_size // 2
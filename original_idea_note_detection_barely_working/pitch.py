@@ -0,0 +1,97 @@
+import re
+
+import numpy as np
+
+from spectrogram import Spectrogram
+
+# Pitch per frame with YIN, computed for all frames of the whole signal at once, so the cost
+# does not depend on the number of candidate pitches, plus a precomputed note table.
+
+A4_FREQ = 440.0
+A4_MIDI = 69
+NOTE_NAMES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+ABC_NAMES = ["C", "^C", "D", "^D", "E", "F", "^F", "G", "^G", "A", "^A", "B"]
+
+
+def midi_to_abc(midi_number):
+    # ABC: C is middle C (C4), c one octave higher, then c', c''; C, C,, below
+    note = ABC_NAMES[midi_number % 12]
+    octave = midi_number // 12 - 1  # MIDI octave starts at -1 for C-1
+    if octave >= 5:
+        return note.lower() + "'" * (octave - 5)
+    return note + "," * (4 - octave)
+
+MIDI_NUMBERS = np.arange(128)
+NOTE_FREQS = A4_FREQ * 2 ** ((MIDI_NUMBERS - A4_MIDI) / 12)
+ABC_TABLE = np.array([midi_to_abc(midi_number) for midi_number in MIDI_NUMBERS])
+
+
+def frequency_to_midi(frequency):
+    midi_number = np.rint(12 * np.log2(np.maximum(frequency, 1e-9) / A4_FREQ) + A4_MIDI)
+    return np.clip(midi_number, 0, 127).astype(np.int64)
+
+def frequency_to_abc(frequency):
+    # Works on numbers and arrays; frequencies <= 0 (unvoiced) become the rest 'z'
+    frequency = np.asarray(frequency, dtype=np.float64)
+    abc = np.where(frequency > 0, ABC_TABLE[frequency_to_midi(frequency)], 'z')
+    return str(abc) if abc.ndim == 0 else abc
+
+def note_frequency(name):
+    # 'A4' -> 440.0, 'C#1' -> 34.6, as in the piano template file names
+    match = re.fullmatch(r'([A-G])(#|b)?(-?\d+)', name)
+    if match is None:
+        raise ValueError("Not a note name " + name)
+    letter, accidental, octave = match.groups()
+    semitone = NOTE_NAMES.index(letter) + {'#': 1, 'b': -1}.get(accidental, 0)
+    return float(NOTE_FREQS[(int(octave) + 1) * 12 + semitone])
+
+def pitch_spectrogram(audio_data, frame_rate, frame_size=2048, hop_size=512):
+    # The transform yin_f0 needs: unwindowed frames zero-padded to twice their length
+    return Spectrogram(audio_data, frame_rate, frame_size, hop_size, 'rect', 2 * frame_size)
+
+def yin_f0(audio_data, frame_rate, frame_size=2048, hop_size=512, fmin=50.0, fmax=2000.0,
+           threshold=0.1, silence=0.05, spectrogram=None):
+    # YIN f0 per frame (0 for frames quieter than silence times the loudest frame). The
+    # difference function of every frame comes from the autocorrelation of a shared
+    # pitch_spectrogram, computed here unless given.
+    spectrogram = spectrogram or pitch_spectrogram(audio_data, frame_rate, frame_size, hop_size)
+    frame_size = spectrogram.window_size
+    frames = spectrogram.frames().astype(np.float64)
+    if len(frames) == 0:
+        return np.zeros(0)
+    autocorrelation = np.fft.irfft(spectrogram.power, axis=1)[:, :frame_size]
+
+    # d(tau) = sum x[j]^2 + sum x[j + tau]^2 - 2 r(tau) over j < frame_size - tau
+    squares = np.cumsum(frames ** 2, axis=1)
+    energy = squares[:, -1:]
+    head = squares[:, ::-1]
+    tail = energy - np.concatenate((np.zeros((len(frames), 1)), squares[:, :-1]), axis=1)
+    difference = head + tail - 2 * autocorrelation
+
+    # Cumulative mean normalized difference, 1 at tau = 0
+    tau = np.arange(frame_size)
+    running = np.cumsum(difference[:, 1:], axis=1)
+    normalized = np.ones_like(difference)
+    normalized[:, 1:] = difference[:, 1:] * tau[1:] / np.maximum(running, 1e-12)
+
+    low, high = max(int(frame_rate / fmax), 1), min(int(frame_rate / fmin), frame_size - 2)
+    window = normalized[:, low - 1:high + 2]
+    center = window[:, 1:-1]
+    dips = (center < threshold) & (center <= window[:, :-2]) & (center <= window[:, 2:])
+    lag = np.where(dips.any(axis=1), np.argmax(dips, axis=1), np.argmin(center, axis=1)) + low
+
+    rows = np.arange(len(lag))
+    left, middle, right = normalized[rows, lag - 1], normalized[rows, lag], normalized[rows, lag + 1]
+    denominator = left - 2 * middle + right
+    shift = np.where(denominator > 0, 0.5 * (left - right) / np.where(denominator > 0, denominator, 1), 0)
+
+    f0 = frame_rate / (lag + shift)
+    level = energy[:, 0]
+    f0[level < silence * np.max(level)] = 0
+    return f0
+
+def segment_f0(f0, start, end, hop_size=512, frame_size=2048):
+    # Median f0 of the voiced frames centered inside [start, end) samples, 0 if there are none
+    centers = np.arange(len(f0)) * hop_size + frame_size // 2
+    voiced = f0[(centers >= start) & (centers < end) & (f0 > 0)]
+    return float(np.median(voiced)) if len(voiced) else 0.0
@@ -0,0 +1,60 @@
+import glob
+import os
+
+import numpy as np
+
+from audio_io import WaveFile
+
+
+class TemplateBank:
+    # Reference recordings loaded and normalized once. A note is scored against all of them
+    # with one batched FFT cross-correlation; template spectra are cached per FFT size.
+
+    def __init__(self, pattern='piano/Piano.ff.*.wav'):
+        self.paths = sorted(glob.glob(pattern))
+        if not self.paths:
+            raise ValueError("No templates found for " + pattern)
+        # 'piano/Piano.ff.A1.wav' -> 'A1'
+        self.names = [os.path.basename(path).split('.')[-2] for path in self.paths]
+
+        templates = []
+        self.frame_rate = None
+        for path in self.paths:
+            wave_file = WaveFile(path)
+            if self.frame_rate not in (None, wave_file.frame_rate):
+                raise ValueError("Frame rates do not match")
+            self.frame_rate = wave_file.frame_rate
+            template = np.asarray(wave_file.mono(), dtype=np.float64)
+            template = template - np.mean(template)
+            templates.append(template / (np.linalg.norm(template) or 1))
+        self.lengths = np.array([len(template) for template in templates])
+
+        self._templates = np.zeros((len(templates), np.max(self.lengths)))
+        for i, template in enumerate(templates):
+            self._templates[i, :len(template)] = template
+        self._spectra = {}
+
+    def spectra(self, n_fft):
+        if n_fft not in self._spectra:
+            self._spectra[n_fft] = np.conj(np.fft.rfft(self._templates, n_fft, axis=1))
+        return self._spectra[n_fft]
+
+    def score(self, audio_data, frame_rate=None):
+        # Maximum of the 'valid' cross-correlation with every template, like np.correlate
+        # (the shorter signal slides over the whole length of the longer one)
+        if frame_rate is not None and frame_rate != self.frame_rate:
+            raise ValueError("Frame rates do not match")
+        audio_data = np.asarray(audio_data, dtype=np.float64)
+        n = len(audio_data)
+        n_fft = 1 << int(np.ceil(np.log2(n + self._templates.shape[1] - 1)))
+        correlation = np.fft.irfft(np.fft.rfft(audio_data, n_fft)[None, :] * self.spectra(n_fft), n_fft, axis=1)
+
+        # Index i holds lag i, or lag i - n_fft in the upper half
+        lags = np.arange(n_fft)
+        lags = np.where(lags < n, lags, lags - n_fft)
+        offset = (n - self.lengths)[:, None]
+        valid = (lags[None, :] >= np.minimum(0, offset)) & (lags[None, :] <= np.maximum(0, offset))
+        return np.max(np.where(valid, correlation, -np.inf), axis=1)
+
+    def best(self, audio_data, frame_rate=None):
+        return self.names[int(np.argmax(self.score(audio_data, frame_rate)))]
@@ -3,49 +3,22 @@ import struct
 import array
 import numpy as np
 import os
+import sys
 
-def read_wave_file(file_path):
-    with wave.open(file_path, 'rb') as wave_file:
-        n_channels = wave_file.getnchannels()
-        sample_width = wave_file.getsampwidth()
-        frame_rate = wave_file.getframerate() ## TODO Might be double the sample rate (divide by sample_width). Also change mean of the stereo
-        n_frames = wave_file.getnframes()
-        frames = wave_file.readframes(n_frames)
-        
-        if sample_width == 1:
-            dtype = np.uint8  # 8-bit audio
-        elif sample_width == 2:
-            dtype = np.int16  # 16-bit audio
-        else:
-            raise ValueError("Unsupported sample width")
-        
-        audio_data = np.frombuffer(frames, dtype=dtype)
-        if n_channels > 1:
-            audio_data = audio_data[::n_channels]  # Use only the first channel
-        
-        return audio_data, frame_rate, wave_file.getparams()
-
-def detect_onsets(audio_data, threshold=1800):
-    onsets = []
-    frame_size = 1024
-    num_frames = len(audio_data) // frame_size
-
-    for i in range(1, num_frames):
-        prev_frame = audio_data[(i - 1) * frame_size:i * frame_size]
-        curr_frame = audio_data[i * frame_size:(i + 1) * frame_size]
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from audio_io import WaveFile
+from onsets import detect_onsets_flux
+from pitch import frequency_to_abc, yin_f0, segment_f0
 
-        prev_energy = sum(abs(x) for x in prev_frame) / frame_size
-        curr_energy = sum(abs(x) for x in curr_frame) / frame_size
-
-        if curr_energy - prev_energy > threshold:
-            onsets.append(i * frame_size)
-
-    return onsets
+def read_wave_file(file_path):
+    wave_file = WaveFile(file_path)
+    return wave_file.read(channel=0), wave_file.frame_rate, wave_file.params  # Use only the first channel
 
 def split_notes(filename):
     audio_data, sample_rate, params = read_wave_file(filename)
 
-    onsets = detect_onsets(audio_data)
+    # Peaks of the spectral flux against their neighbourhood, no fixed level threshold
+    onsets = detect_onsets_flux(audio_data)
     note_segments = []
 
     for i in range(len(onsets) - 1):
@@ -53,7 +26,7 @@ def split_notes(filename):
         end = onsets[i + 1]
         note_segments.append(audio_data[start:end])
 
-    return note_segments, sample_rate, params
+    return note_segments, sample_rate, params, onsets
 
 def save_wave_file(file_path, params, wave_data):
     with wave.open(file_path, 'w') as wav_file:
@@ -101,30 +74,6 @@ def estimate_duration(len_note, frame_rate):
     else:
         return "/32"  # Shorter note
 
-def frequency_to_abc(frequency):
-    # Reference: MIDI note 69 is A4 (440 Hz)
-    A4_freq = 440.0
-    A4_midi = 69
-    
-    # Calculate the MIDI note number
-    midi_number = round(12 * np.log2(frequency / A4_freq) + A4_midi)
-    
-    # Define ABC notation note names
-    abc_notes = ["C", "^C", "D", "^D", "E", "F", "^F", "G", "^G", "A", "^A", "B"]
-    
-    # Calculate note name and octave
-    note_index = (midi_number - 12) % 12
-    octave = (midi_number // 12) - 1  # MIDI octave starts at -1 for C-1
-    
-    # Convert octave to ABC notation format
-    note = abc_notes[note_index]
-    if octave >= 5:
-        note = note.lower() + "'" * (octave - 4)
-    elif octave < 4:
-        note = note + "," * (3 - octave)
-    
-    return note
-
 # Example usage:
 filename = 'alle_meine_entchen--heilpaedagogik-info-de.wav'
 
@@ -132,21 +81,16 @@ filename = 'alle_meine_entchen--heilpaedagogik-info-de.wav'
 audio_data, frame_rate, params = read_wave_file(filename)
 save_wave_file("out.wav", params, audio_data)
 
-notes, sr, params = split_notes(filename)
+notes, sr, params, onsets = split_notes(filename)
+# One STFT for the whole song instead of correlating every note with every candidate sine
+f0 = yin_f0(read_wave_file(filename)[0], sr)
 abc_notation = []
 for i, note_data in enumerate(notes):
     output_file = os.path.join("out", f'note_{i+1}.wav')
     save_wave_file(output_file, params, note_data)
 
-    # Find the dominant frequency of the note
-    max_correlation = 0
-    dominant_freq = 0
-    frequencies = np.linspace(300, 600, 100)
-    for freq in frequencies:
-        correlation = check_sine_wave(note_data, sr, freq)
-        if correlation > max_correlation:
-            max_correlation = correlation
-            dominant_freq = freq
+    # Median pitch of the frames inside the note
+    dominant_freq = segment_f0(f0, onsets[i], onsets[i + 1])
     
     # Convert the dominant frequency to ABC notation
     abc_note = frequency_to_abc(dominant_freq)
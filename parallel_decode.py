@@ -0,0 +1,157 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import morse_to_text
+from audio_io import Decimator, WaveFile, decimate, read_decimated
+from audio_to_phonenumber import (DTMF_BAND, default_chunk_size, dtmf_digits, estimate_timing,
+                                  segment_dtmf_bins, segment_on_silence)
+from batch_decode import detect_mode
+from dtmf_timing import DEFAULT_TIMING, DTMFTiming
+
+# The file is split into cores of segment_seconds. Each worker memory-maps the file itself
+# and decodes its core extended by the overlap on both sides, but only keeps the tones that
+# start inside its core. DTMF cores are decimated in a first pass that also sums up the
+# global silence threshold, and segmented from those blocks in a second one. As long as the overlap is longer than one tone plus gap, every tone
+# lies completely inside the window of exactly one worker, so stitching the results in
+# order neither duplicates nor loses symbols.
+
+
+def split_cores(n_frames, core_frames, align):
+    core_frames = max(align, core_frames // align * align)
+    starts = np.arange(0, n_frames, core_frames)
+    return [(int(start), int(min(start + core_frames, n_frames))) for start in starts]
+
+def _extended(core_start, core_end, overlap, n_frames):
+    return max(0, core_start - overlap), min(n_frames, core_end + overlap)
+
+def _read_phone(wave_file, start, end, target_rate):
+    # The window passes the same band-pass decimating front-end as decode_phone. Windows start
+    # at multiples of the decimation factor, so their samples lie on one common grid.
+    audio_data = wave_file.read(start, end)
+    if not target_rate:
+        return audio_data, wave_file.frame_rate
+    return decimate(audio_data, wave_file.frame_rate, target_rate, DTMF_BAND)
+
+def _read_phone_core(file_path, core_start, core_end, overlap, target_rate):
+    # The core extended by the overlap goes through the front-end once. The magnitude sum of
+    # the core alone feeds the global silence threshold, the block is segmented afterwards.
+    wave_file = WaveFile(file_path)
+    start, end = _extended(core_start, core_end, overlap, wave_file.n_frames)
+    audio_data, rate = _read_phone(wave_file, start, end, target_rate)
+    factor = int(round(wave_file.frame_rate / rate))
+    core = np.abs(audio_data[(core_start - start) // factor:(core_end - start) // factor].astype(np.float64))
+    return audio_data, start, float(np.sum(core)), len(core)
+
+def _decode_phone_core(audio_data, rate, start, factor, core_start, core_end, silence_threshold, chunk_size,
+                       timing):
+    segments = segment_on_silence(audio_data, rate, chunk_size, min_silence=timing.min_silence(),
+                                  silence_threshold=silence_threshold)
+    tone_starts = segments[:, 0] * factor + start
+    owned = (tone_starts >= core_start) & (tone_starts < core_end)
+    return dtmf_digits(segment_dtmf_bins(audio_data, segments[owned], rate))
+
+def decode_phone_parallel(audio_file, workers=None, segment_seconds=60, overlap_seconds=2.0, chunk_size=None,
+                          timing=None, calibration_seconds=30, target_rate=8000):
+    # chunk_size is in samples at the decimated rate. timing is inferred from the first
+    # calibration_seconds unless given, the overlap has to exceed one tone plus gap.
+    wave_file = WaveFile(audio_file)
+    rate, n_frames = wave_file.frame_rate, wave_file.n_frames
+    factor = Decimator(rate, target_rate).factor if target_rate else 1
+    if timing is None:
+        calibration, out_rate = _read_phone(wave_file, 0, int(rate * calibration_seconds), target_rate)
+        timing = estimate_timing(calibration, out_rate)
+    chunk_size = chunk_size or default_chunk_size(rate / factor)
+    align = chunk_size * factor
+    cores = split_cores(n_frames, int(rate * segment_seconds), align)
+    overlap = -(-int(rate * max(overlap_seconds, timing.tone + timing.gap)) // align) * align
+    files = [audio_file] * len(cores)
+    starts, ends = [start for start, _ in cores], [end for _, end in cores]
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        # Same global threshold as segment_on_silence, summed in parallel as well. The
+        # decimated blocks are handed back to the workers for segmenting.
+        blocks = list(executor.map(_read_phone_core, files, starts, ends, [overlap] * len(cores),
+                                   [target_rate] * len(cores)))
+        silence_threshold = sum(total for _, _, total, _ in blocks) \
+            / max(sum(count for _, _, _, count in blocks), 1) * 0.5
+        digits = executor.map(_decode_phone_core, [audio_data for audio_data, _, _, _ in blocks],
+                              [rate / factor] * len(cores), [start for _, start, _, _ in blocks],
+                              [factor] * len(cores), starts, ends, [silence_threshold] * len(cores),
+                              [chunk_size] * len(cores), [timing] * len(cores))
+        return ''.join(digits)
+
+def _morse_runs_core(file_path, core_start, core_end, overlap, threshold):
+    # Returns the absolute (starts, ends) in envelope frames of the on-runs starting in the core
+    wave_file = WaveFile(file_path)
+    start, end = _extended(core_start, core_end, overlap, wave_file.n_frames)
+    envelope, frame_size = morse_to_text.morse_envelope(wave_file.read(start, end), wave_file.frame_rate)
+    run_starts, run_ends = morse_to_text.run_lengths(morse_to_text.debounce(envelope >= threshold))
+    offset = start // frame_size
+    owned = (run_starts + offset >= core_start // frame_size) & (run_starts + offset < core_end // frame_size)
+    return run_starts[owned] + offset, run_ends[owned] + offset
+
+def decode_morse_parallel(audio_file, workers=None, segment_seconds=60, overlap_seconds=2.0,
+                          calibration_seconds=30, dot_duration=None):
+    # Threshold and dot length are estimated once from the first calibration_seconds,
+    # the gaps are classified after stitching so they can span core boundaries.
+    wave_file = WaveFile(audio_file)
+    rate, n_frames = wave_file.frame_rate, wave_file.n_frames
+    envelope, frame_size = morse_to_text.morse_envelope(wave_file.read(0, int(rate * calibration_seconds)), rate)
+    if len(envelope) == 0 or not morse_to_text.has_contrast(envelope):
+        return ''
+    threshold = morse_to_text.envelope_threshold(envelope)
+
+    cores = split_cores(n_frames, int(rate * segment_seconds), frame_size)
+    overlap = -(-int(rate * overlap_seconds) // frame_size) * frame_size
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        runs = list(executor.map(_morse_runs_core, [audio_file] * len(cores), [start for start, _ in cores],
+                                 [end for _, end in cores], [overlap] * len(cores), [threshold] * len(cores)))
+    starts = np.concatenate([run_starts for run_starts, _ in runs])
+    ends = np.concatenate([run_ends for _, run_ends in runs])
+    if len(starts) == 0:
+        return ''
+
+    if dot_duration is None:
+        calibration = starts < len(envelope)
+        dot_frames = morse_to_text.estimate_dot_frames(
+            ends[calibration] - starts[calibration],
+            (starts[1:] - ends[:-1])[calibration[1:]],
+            morse_to_text.DOT_DURATION * rate / frame_size)
+    else:
+        dot_frames = dot_duration * rate / frame_size
+    return morse_to_text.classify_runs(starts, ends, dot_frames)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decode one long DTMF or Morse recording on all cores.")
+    parser.add_argument('path')
+    parser.add_argument('--mode', choices=('auto', 'dtmf', 'morse', 'multicarrier'), default='auto')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--segment-seconds', type=float, default=60)
+    parser.add_argument('--overlap-seconds', type=float, default=2.0)
+    parser.add_argument('--tone', type=float, default=None, help="DTMF tone length in seconds, inferred if omitted")
+    parser.add_argument('--gap', type=float, default=None, help="DTMF gap length in seconds, inferred if omitted")
+    args = parser.parse_args(argv)
+
+    mode = args.mode
+    if mode == 'auto':
+        wave_file = WaveFile(args.path)
+        mode = detect_mode(wave_file.read(), wave_file.frame_rate)
+    if mode == 'dtmf':
+        timing = None
+        if args.tone or args.gap:
+            timing = DTMFTiming(args.tone or DEFAULT_TIMING.tone, args.gap or DEFAULT_TIMING.gap)
+        print(decode_phone_parallel(args.path, args.workers, args.segment_seconds, args.overlap_seconds,
+                                    timing=timing))
+    elif mode == 'multicarrier':
+        # The carriers are striped character by character, so the file is decoded in one piece
+        print(morse_to_text.decode_multicarrier(*read_decimated(args.path)))
+    else:
+        morse_code = decode_morse_parallel(args.path, args.workers, args.segment_seconds, args.overlap_seconds)
+        print(morse_to_text.morse_to_text(morse_code))
+
+if __name__ == "__main__":
+    sys.exit(main())
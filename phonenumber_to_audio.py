@@ -1,5 +1,7 @@
 import numpy as np
-from scipy.io.wavfile import write
+from functools import lru_cache
+from audio_io import WaveWriter, iter_symbol_chunks
+from dtmf_timing import DEFAULT_TIMING
 
 # DTMF frequencies
 DTMF_FREQS = {
@@ -26,22 +28,64 @@ def generate_tone(frequencies, duration=0.5, sample_rate=44100):
     tone = np.sin(2 * np.pi * frequencies[0] * t) + np.sin(2 * np.pi * frequencies[1] * t)
     return tone
 
-def encode_phone_number(phone_number, sample_rate=44100):
-    tones = []
-    for digit in phone_number:
-        if digit in DTMF_FREQS:
-            tone = generate_tone(DTMF_FREQS[digit], sample_rate=sample_rate)
-            tones.append(tone)
-            # Add a short silence between tones
-            tones.append(np.zeros(int(sample_rate * 0.1)))
-    return np.concatenate(tones)
+DIGITS = ''.join(DTMF_FREQS)
+TONE_PEAK = 2.0  # two superimposed unit sines
+
+# Index into DIGITS for every ASCII code, -1 for characters without a tone
+DIGIT_INDEX = np.full(128, -1, dtype=np.int64)
+DIGIT_INDEX[[ord(digit) for digit in DIGITS]] = np.arange(len(DIGITS))
+
+@lru_cache(maxsize=None)
+def tone_table(sample_rate=44100, duration=0.5, gap=0.1):
+    # One row per digit in DIGITS: the tone followed by the silence before the next tone
+    n_gap = int(sample_rate * gap)
+    table = np.stack([np.concatenate((generate_tone(DTMF_FREQS[digit], duration, sample_rate), np.zeros(n_gap)))
+                      for digit in DIGITS])
+    table.flags.writeable = False
+    return table
+
+@lru_cache(maxsize=None)
+def pcm_tone_table(sample_rate=44100, duration=0.5, gap=0.1):
+    table = np.int16(tone_table(sample_rate, duration, gap) / TONE_PEAK * 32767)
+    table.flags.writeable = False
+    return table
+
+def digit_indices(phone_number):
+    codes = np.fromiter(map(ord, phone_number), dtype=np.int64, count=len(phone_number))
+    indices = DIGIT_INDEX[np.minimum(codes, 127)]
+    indices[codes > 127] = -1
+    return indices[indices >= 0]
+
+def encode_phone_number(phone_number, sample_rate=44100, timing=DEFAULT_TIMING):
+    return tone_table(sample_rate, timing.tone, timing.gap)[digit_indices(phone_number)].reshape(-1)
+
+def encode_phone_number_pcm(phone_number, sample_rate=44100, timing=DEFAULT_TIMING):
+    # Fills a preallocated int16 buffer straight from the cached tone table, using the
+    # fixed TONE_PEAK instead of normalizing the finished signal
+    table = pcm_tone_table(sample_rate, timing.tone, timing.gap)
+    indices = digit_indices(phone_number)
+    audio = np.empty(len(indices) * table.shape[1], dtype=np.int16)
+    np.take(table, indices, axis=0, out=audio.reshape(len(indices), table.shape[1]))
+    return audio
+
+def iter_phone_number_blocks(phone_number, sample_rate=44100, digits_per_block=64, timing=DEFAULT_TIMING):
+    # phone_number may be a string or any iterable of digits, e.g. a generator
+    for digits in iter_symbol_chunks(phone_number, digits_per_block):
+        yield encode_phone_number_pcm(digits, sample_rate, timing)
+
+def stream_to_wav(phone_number, filename, sample_rate=44100, timing=DEFAULT_TIMING):
+    with WaveWriter(filename, sample_rate, peak=TONE_PEAK) as writer:
+        writer.write_blocks(iter_phone_number_blocks(phone_number, sample_rate, timing=timing))
 
 def save_to_wav(data, filename, sample_rate=44100):
-    # Normalize to 16-bit range
-    data = np.int16(data / np.max(np.abs(data)) * 32767)
+    # SciPy costs a few hundred milliseconds to import, so only pay for it when writing
+    from scipy.io.wavfile import write
+    if data.dtype != np.int16:
+        # Normalize to 16-bit range
+        data = np.int16(data / np.max(np.abs(data)) * 32767)
     write(filename, sample_rate, data)
 
 if __name__ == "__main__":
     phone_number = "123-456-7890"
-    audio_data = encode_phone_number(phone_number)
+    audio_data = encode_phone_number_pcm(phone_number)
     save_to_wav(audio_data, "phone_number.wav")
\ No newline at end of file
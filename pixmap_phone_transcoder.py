@@ -1,33 +1,193 @@
+import numpy as np
+
+from compression import CODECS, Decompressor, compress
+
+# The 16 DTMF symbols in nibble order, used by the binary transfer mode
+NIBBLE_SYMBOLS = '0123456789ABCD*#'
+NIBBLE_ARRAY = np.frombuffer(NIBBLE_SYMBOLS.encode('ascii'), dtype=np.uint8)
+NIBBLE_INDEX = np.full(256, -1, dtype=np.int16)
+NIBBLE_INDEX[NIBBLE_ARRAY] = np.arange(16)
+
+# Magic numbers of the binary formats and their samples per pixel
+CHANNELS = {'P5': 1, 'P6': 3}
+ASCII_TO_BINARY = {'P2': 'P5', 'P3': 'P6'}
+HEADER_SYMBOLS = 14
+
 def encode_pixmap(file_path):
     with open(file_path, 'r') as file:
         lines = file.readlines()
     
-    encoded_string = ""
-    for line in lines[1:]:  # Skip the first line (standard number)
-        encoded_string += line.strip().replace(" ", "#") + "*"
-    
-    return encoded_string
+    # Skip the first line (standard number)
+    return "".join(line.strip().replace(" ", "#") + "*" for line in lines[1:])
 
 def decode_pixmap(encoded_string, output_file_path):
-    decoded_lines = encoded_string.replace("*", "\n").replace("#", " ")
+    decoded_lines = encoded_string.translate(str.maketrans("*#", "\n "))
     with open(output_file_path, 'w') as file:
         file.write("P3\n")  # Write the standard number
         file.write(decoded_lines)
 
+def read_pixmap(file_path):
+    # Returns (magic, width, height, maxval, body) with the body as binary (P5/P6) samples,
+    # converting the ASCII formats P2/P3 on the way
+    with open(file_path, 'rb') as file:
+        content = file.read()
+
+    tokens = []
+    position = 0
+    while len(tokens) < 4:
+        while content[position:position + 1].isspace():
+            position += 1
+        if content[position:position + 1] == b'#':
+            position = content.index(b'\n', position)
+            continue
+        end = position
+        while end < len(content) and not content[end:end + 1].isspace():
+            end += 1
+        tokens.append(content[position:end].decode('ascii'))
+        position = end
+    magic, width, height, maxval = tokens[0], int(tokens[1]), int(tokens[2]), int(tokens[3])
+
+    dtype = np.dtype('u1') if maxval < 256 else np.dtype('>u2')
+    if magic in ASCII_TO_BINARY:
+        body = np.array(content[position:].split(), dtype=np.int64).astype(dtype).tobytes()
+        magic = ASCII_TO_BINARY[magic]
+    elif magic in CHANNELS:
+        body = content[position + 1:]
+    else:
+        raise ValueError("Unsupported pixmap format " + magic)
+    return magic, width, height, maxval, body
+
+def bytes_to_symbols(data):
+    data = np.frombuffer(data, dtype=np.uint8)
+    nibbles = np.stack((data >> 4, data & 0x0F), axis=1).reshape(-1)
+    return NIBBLE_ARRAY[nibbles].tobytes().decode('ascii')
+
+def symbols_to_bytes(symbols):
+    nibbles = NIBBLE_INDEX[np.frombuffer(symbols.encode('ascii'), dtype=np.uint8)]
+    if np.any(nibbles < 0):
+        raise ValueError("Symbol outside of the DTMF alphabet")
+    nibbles = nibbles[:len(nibbles) // 2 * 2].astype(np.uint8).reshape(-1, 2)
+    return (nibbles[:, 0] << 4 | nibbles[:, 1]).tobytes()
+
+def encode_header(magic, width, height, maxval, codec='none'):
+    # 14 nibbles: format (5 or 6), codec, then width, height and maxval as 16-bit numbers
+    return NIBBLE_SYMBOLS[int(magic[1])] + NIBBLE_SYMBOLS[CODECS.index(codec)] \
+        + bytes_to_symbols(np.array([width, height, maxval], dtype='>u2').tobytes())
+
+def decode_header(symbols):
+    # Raises ValueError naming the damaged field, e.g. after a misdetected tone
+    if len(symbols) < HEADER_SYMBOLS:
+        raise ValueError("Pixmap header is incomplete")
+    magic = 'P' + str(NIBBLE_SYMBOLS.find(symbols[0]))
+    if magic not in CHANNELS:
+        raise ValueError(f"Damaged pixmap header: format symbol {symbols[0]!r} is not 5 or 6")
+    codec = NIBBLE_SYMBOLS.find(symbols[1])
+    if not 0 <= codec < len(CODECS):
+        raise ValueError(f"Damaged pixmap header: codec symbol {symbols[1]!r} is not one of "
+                         + ', '.join(NIBBLE_SYMBOLS[:len(CODECS)]))
+    width, height, maxval = np.frombuffer(symbols_to_bytes(symbols[2:HEADER_SYMBOLS]), dtype='>u2')
+    if maxval == 0:
+        raise ValueError("Damaged pixmap header: maxval is 0")
+    return magic, CODECS[codec], int(width), int(height), int(maxval)
+
+def sample_bytes(magic, width, maxval):
+    # Bytes per image row
+    return width * CHANNELS[magic] * (1 if maxval < 256 else 2)
+
+def encode_pixmap_binary(file_path, codec='none'):
+    # Two DTMF symbols per byte of (compressed) raw samples instead of the ASCII P3 text
+    magic, width, height, maxval, body = read_pixmap(file_path)
+    body = compress(body, codec, sample_bytes(magic, width, maxval))
+    return encode_header(magic, width, height, maxval, codec) + bytes_to_symbols(body)
+
+
+class PixmapReceiver:
+    # Rebuilds an image from DTMF symbols as they arrive, e.g. from decode_phone_stream,
+    # decompressing and writing every complete row straight to the output file
+
+    def __init__(self, output_file_path):
+        self.output_file_path = output_file_path
+        self._symbols = ''
+        self._file = None
+
+    def feed(self, symbols):
+        self._symbols += symbols
+        if self._file is None:
+            if len(self._symbols) < HEADER_SYMBOLS:
+                return
+            self._open(self._symbols[:HEADER_SYMBOLS])
+            self._symbols = self._symbols[HEADER_SYMBOLS:]
+        n_symbols = len(self._symbols) // 2 * 2
+        self._write(self._decompressor.decompress(symbols_to_bytes(self._symbols[:n_symbols])))
+        self._symbols = self._symbols[n_symbols:]
+
+    def close(self):
+        if self._file is None:
+            return
+        self._write(self._decompressor.flush())
+        # Pad to the expected size, so lost symbols still give a readable image
+        self._file.write(bytes(self._remaining))
+        self._file.close()
+        self._file = None
+
+    def _open(self, header):
+        magic, codec, width, height, maxval = decode_header(header)
+        row_bytes = sample_bytes(magic, width, maxval)
+        self._decompressor = Decompressor(codec, row_bytes)
+        self._remaining = row_bytes * height
+        self._file = open(self.output_file_path, 'wb')
+        self._file.write(f"{magic}\n{width} {height}\n{maxval}\n".encode('ascii'))
+
+    def _write(self, data):
+        data = data[:self._remaining]
+        self._file.write(data)
+        self._remaining -= len(data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def decode_pixmap_binary(encoded_string, output_file_path):
+    with PixmapReceiver(output_file_path) as receiver:
+        receiver.feed(encoded_string)
+
 
 if __name__ == "__main__":
     import audio_to_phonenumber
+    import fsk_modem
     import phonenumber_to_audio
-    print("1: Encode, 2: Decode")
+    print("1: Encode, 2: Decode, 3: Encode binary, 4: Decode binary, 5: Encode FSK, 6: Decode FSK")
     choice = input()
     file = input("Enter the file path: ")
     if choice == '1':
         encoded = encode_pixmap(file)
-        audio = phonenumber_to_audio.encode_phone_number(encoded)
+        audio = phonenumber_to_audio.encode_phone_number_pcm(encoded)
         phonenumber_to_audio.save_to_wav(audio, "phone_number.wav")
 
         
     elif choice == '2':
         phone_number = audio_to_phonenumber.decode_phone(file)
         print(phone_number)
-        decoded_message = decode_pixmap(phone_number, "output.pbm")
\ No newline at end of file
+        decoded_message = decode_pixmap(phone_number, "output.pbm")
+
+    elif choice == '3':
+        codec = input("Compression (none, rle, zlib): ") or 'none'
+        encoded = encode_pixmap_binary(file, codec)
+        phonenumber_to_audio.stream_to_wav(encoded, "phone_number.wav")
+
+    elif choice == '4':
+        with PixmapReceiver("output.pnm") as receiver:
+            for digit in audio_to_phonenumber.decode_phone_stream(file):
+                receiver.feed(digit)
+
+    elif choice == '5':
+        # Same framing as the binary mode, sent as bytes over the FSK modem
+        codec = input("Compression (none, rle, zlib): ") or 'none'
+        encoded = encode_pixmap_binary(file, codec)
+        fsk_modem.save_payload_wav(symbols_to_bytes(encoded), "fsk.wav")
+
+    elif choice == '6':
+        decode_pixmap_binary(bytes_to_symbols(fsk_modem.decode_payload(file)), "output.pnm")
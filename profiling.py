@@ -0,0 +1,115 @@
+import json
+import time
+import tracemalloc
+from contextvars import ContextVar
+
+# Opt-in per-stage counters for the decode pipelines:
+#
+#     with Profiler(allocations=True) as profiler:
+#         decode_phone('phone_number.wav')
+#     print(profiler.to_json())
+#
+# Without an active Profiler, stage() hands out one shared object that does nothing,
+# so the instrumented code pays for a context variable lookup per stage and no more.
+
+_active = ContextVar('profiler', default=None)
+
+
+class StageStats:
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.samples = 0
+        self.segments = 0
+        self.allocated_bytes = 0
+
+    def to_dict(self):
+        return {'calls': self.calls, 'seconds': self.seconds, 'samples': self.samples,
+                'segments': self.segments, 'allocated_bytes': self.allocated_bytes}
+
+
+class _Stage:
+    # One timed run of a stage; counts can be added while it runs
+
+    def __init__(self, stats, allocations, samples, segments):
+        self._stats = stats
+        self._allocations = allocations
+        stats.samples += samples
+        stats.segments += segments
+
+    def count(self, samples=0, segments=0):
+        self._stats.samples += samples
+        self._stats.segments += segments
+
+    def __enter__(self):
+        if self._allocations:
+            # Peak above the memory in use at the start, nested stages reset the peak
+            self._memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stats.seconds += time.perf_counter() - self._start
+        self._stats.calls += 1
+        if self._allocations:
+            self._stats.allocated_bytes += max(tracemalloc.get_traced_memory()[1] - self._memory, 0)
+
+
+class _NoStage:
+
+    def count(self, samples=0, segments=0):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name, samples=0, segments=0):
+    profiler = _active.get()
+    if profiler is None:
+        return _NO_STAGE
+    return _Stage(profiler.stats(name), profiler.allocations, samples, segments)
+
+
+class Profiler:
+    # Collects the stages run inside the with block, in the order they first ran.
+    # allocations=True traces Python and numpy allocations with tracemalloc, which
+    # slows the pipeline down noticeably.
+
+    def __init__(self, allocations=False):
+        self.allocations = allocations
+        self.stages = {}
+        self.seconds = 0.0
+
+    def stats(self, name):
+        if name not in self.stages:
+            self.stages[name] = StageStats()
+        return self.stages[name]
+
+    def __enter__(self):
+        self._token = _active.set(self)
+        self._started_tracing = self.allocations and not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds += time.perf_counter() - self._start
+        if self._started_tracing:
+            tracemalloc.stop()
+        _active.reset(self._token)
+
+    def to_dict(self):
+        return {'seconds': self.seconds,
+                'stages': {name: stats.to_dict() for name, stats in self.stages.items()}}
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
@@ -0,0 +1,115 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from audio_io import WaveFile, read_decimated
+from profiling import stage
+
+# One short-time Fourier transform per recording, shared by the detectors that need
+# frequency content: DTMF tone energies, multi-carrier Morse envelopes, onset flux and
+# pitch. Frames are strided views of the samples and go through np.fft.rfft in batches,
+# the spectrum is kept as complex64.
+
+WINDOWS = {
+    'hann': np.hanning,
+    'hamming': np.hamming,
+    'blackman': np.blackman,
+    'rect': np.ones,
+}
+
+
+def frame_view(audio_data, frame_size, hop_size=None):
+    # (n_frames, frame_size) view without copying, one row every hop_size samples
+    hop_size = hop_size or frame_size
+    if len(audio_data) < frame_size:
+        return np.zeros((0, frame_size), dtype=audio_data.dtype)
+    return np.lib.stride_tricks.sliding_window_view(audio_data, frame_size)[::hop_size]
+
+
+class Spectrogram:
+    # STFT of audio_data with frames of window_size samples every hop_size samples.
+    # n_fft > window_size zero-pads the frames for a finer bin spacing. The samples are
+    # kept, so time-domain analyses of the same recording can use them too.
+
+    def __init__(self, audio_data, frame_rate, window_size=2048, hop_size=None, window='hann',
+                 n_fft=None, batch_frames=4096):
+        self.audio = audio_data
+        self.frame_rate = frame_rate
+        self.window_size = window_size
+        self.hop_size = hop_size or window_size // 2
+        self.window = window
+        self.n_fft = n_fft or window_size
+
+        frames = frame_view(np.asarray(audio_data), window_size, self.hop_size)
+        weights = WINDOWS[window](window_size).astype(np.float32)
+        self.spectrum = np.empty((len(frames), self.n_fft // 2 + 1), dtype=np.complex64)
+        for start in range(0, len(frames), batch_frames):
+            batch = frames[start:start + batch_frames].astype(np.float32) * weights
+            self.spectrum[start:start + batch_frames] = np.fft.rfft(batch, self.n_fft, axis=1)
+        self.freqs = np.fft.rfftfreq(self.n_fft, 1 / frame_rate).astype(np.float32)
+        self._magnitude = None
+
+    def __len__(self):
+        return len(self.spectrum)
+
+    @property
+    def magnitude(self):
+        if self._magnitude is None:
+            self._magnitude = np.abs(self.spectrum)
+        return self._magnitude
+
+    @property
+    def power(self):
+        return self.magnitude ** 2
+
+    def frames(self):
+        # The time-domain frames the spectrum was computed from, unwindowed
+        return frame_view(np.asarray(self.audio), self.window_size, self.hop_size)[:len(self)]
+
+    def centers(self):
+        # Sample index of the center of every frame
+        return np.arange(len(self)) * self.hop_size + self.window_size // 2
+
+    def bins(self, frequencies):
+        # Nearest bin of every frequency
+        bins = np.rint(np.asarray(frequencies) * self.n_fft / self.frame_rate).astype(np.int64)
+        return np.clip(bins, 0, self.spectrum.shape[1] - 1)
+
+    def bin_magnitudes(self, frequencies):
+        # (n_frames, n_frequencies)
+        return self.magnitude[:, self.bins(frequencies)]
+
+    def band_energy(self, low, high):
+        # Power per frame summed over the bins from low to high Hz
+        start, stop = self.bins([low, high])
+        return np.sum(self.power[:, start:stop + 1], axis=1)
+
+    def segment_sums(self, values, segments):
+        # Sums per-frame values over the frames centered inside each (start, end) sample
+        # range, e.g. band or bin energies per tone
+        segments = np.asarray(segments).reshape(-1, 2)
+        centers = self.centers()
+        first = np.searchsorted(centers, segments[:, 0])
+        last = np.searchsorted(centers, segments[:, 1])
+        cumulative = np.concatenate((np.zeros((1,) + values.shape[1:]), np.cumsum(values, axis=0)))
+        return cumulative[last] - cumulative[first]
+
+
+@lru_cache(maxsize=8)
+def _cached_spectrogram(path, modified, window_size, hop_size, window, n_fft, channel, target_rate, band):
+    if target_rate:
+        audio_data, frame_rate = read_decimated(path, target_rate, band, channel)
+    else:
+        wave_file = WaveFile(path)
+        audio_data, frame_rate = wave_file.read(channel=channel), wave_file.frame_rate
+    with stage('stft', samples=len(audio_data)):
+        return Spectrogram(audio_data, frame_rate, window_size, hop_size, window, n_fft)
+
+def spectrogram(file_path, window_size=2048, hop_size=None, window='hann', n_fft=None, channel=0,
+                target_rate=None, band=None):
+    # Cached per file and parameters; a rewritten file is transformed again. Keep in mind
+    # every cached spectrogram holds its samples and spectrum in memory.
+    path = os.path.abspath(file_path)
+    return _cached_spectrogram(path, os.path.getmtime(path), window_size, hop_size, window, n_fft,
+                               channel, target_rate, tuple(band) if band else None)
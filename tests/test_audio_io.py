@@ -0,0 +1,37 @@
+import wave
+
+import numpy as np
+import pytest
+
+from audio_io import Decimator, WaveFile, decimate, pcm_samples
+
+
+def test_decimate_empty():
+    # Only the flushed filter tail comes out
+    audio_data, rate = decimate(np.zeros(0), 44100)
+    assert not audio_data.any()
+    assert rate == 44100 // 5
+
+def test_decimator_empty_and_single_sample_blocks():
+    audio_data = np.sin(2 * np.pi * 440 * np.arange(4410) / 44100)
+    expected = Decimator(44100).process(audio_data)
+
+    decimator = Decimator(44100)
+    blocks = [decimator.process(np.zeros(0))]
+    blocks += [decimator.process(audio_data[i:i + 1]) for i in range(100)]
+    blocks.append(decimator.process(np.zeros(0)))
+    blocks.append(decimator.process(audio_data[100:]))
+    assert np.allclose(np.concatenate(blocks), expected, atol=1e-6)
+
+@pytest.mark.parametrize('sample_width', [1, 2, 3, 4])
+def test_pcm_samples_match_wave_file(tmp_path, sample_width):
+    # Stdin is read through pcm_samples, files through WaveFile, both must agree
+    path = str(tmp_path / 'stereo.wav')
+    frames = np.random.default_rng(sample_width).integers(0, 256, 2 * sample_width * 100, dtype=np.uint8).tobytes()
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(2)
+        wav_file.setsampwidth(sample_width)
+        wav_file.setframerate(8000)
+        wav_file.writeframes(frames)
+    for channel in range(2):
+        assert np.array_equal(pcm_samples(frames, sample_width, 2, channel), WaveFile(path).read(channel=channel))
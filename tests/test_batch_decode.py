@@ -0,0 +1,15 @@
+import numpy as np
+
+from batch_decode import detect_mode
+from phonenumber_to_audio import encode_phone_number
+from text_to_morse import SAMPLE_RATE, generate_morse_audio, generate_multicarrier_audio, text_to_morse
+
+
+def test_detect_mode():
+    assert detect_mode(encode_phone_number('0123456789ABCD*#'), 44100) == 'dtmf'
+    assert detect_mode(generate_morse_audio(text_to_morse('HELLO WORLD')), SAMPLE_RATE) == 'morse'
+    assert detect_mode(generate_multicarrier_audio('HELLO WORLD'), SAMPLE_RATE) == 'multicarrier'
+    assert detect_mode(generate_multicarrier_audio('AB'), SAMPLE_RATE) == 'multicarrier'
+
+def test_detect_mode_empty():
+    assert detect_mode(np.zeros(0), 44100) == 'dtmf'
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from audio_io import decimate
+from morse_to_text import MorseStreamDecoder, decode_morse, decode_multicarrier, morse_to_text
+from text_to_morse import SAMPLE_RATE, generate_morse_audio, generate_multicarrier_audio, text_to_morse
+
+# Payloads whose on-runs all last equally long, where the dot length cannot be read
+# from the run lengths alone
+SHORT_PAYLOADS = ['T', 'TT', 'TM', 'E', 'EE', 'I', 'M', 'ET']
+
+
+@pytest.mark.parametrize('text', SHORT_PAYLOADS + ['SOS', 'HELLO WORLD 42'])
+def test_decode_morse(text):
+    audio_data, frame_rate = decimate(generate_morse_audio(text_to_morse(text)), SAMPLE_RATE)
+    assert morse_to_text(decode_morse(audio_data, frame_rate)) == text
+
+@pytest.mark.parametrize('text', SHORT_PAYLOADS)
+def test_stream_decoder(text):
+    audio_data, frame_rate = decimate(generate_morse_audio(text_to_morse(text)), SAMPLE_RATE)
+    decoder = MorseStreamDecoder(frame_rate)
+    assert decoder.feed(audio_data) + decoder.flush() == text
+
+@pytest.mark.parametrize('text', SHORT_PAYLOADS)
+def test_decode_multicarrier(text):
+    assert decode_multicarrier(generate_multicarrier_audio(text), SAMPLE_RATE) == text
+
+def test_silence():
+    assert decode_morse(np.zeros(SAMPLE_RATE), SAMPLE_RATE) == ''
+    assert decode_multicarrier(np.zeros(SAMPLE_RATE), SAMPLE_RATE) == ''
@@ -1,5 +1,7 @@
 import numpy as np
 import wave
+from functools import lru_cache
+from audio_io import WaveWriter, iter_symbol_chunks
 
 # Morse code dictionary
 MORSE_CODE_DICT = {
@@ -16,6 +18,11 @@ DOT_DURATION = 0.1  # seconds
 DASH_DURATION = 0.3  # seconds
 FREQUENCY = 1000  # Hz
 
+# Multi-carrier mode: the text is striped character by character across the carriers.
+# A space would vanish between two character gaps, so it is keyed as the '_' code instead.
+CARRIERS = tuple(range(600, 2401, 200))  # Hz
+MULTICARRIER_SPACE_CODE = '..--.-'
+
 def text_to_morse(text):
     return ' '.join(MORSE_CODE_DICT.get(char.upper(), '') for char in text)
 
@@ -23,18 +30,70 @@ def generate_tone(frequency, duration, sample_rate):
     t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
     return 0.5 * np.sin(2 * np.pi * frequency * t)
 
-def generate_morse_audio(morse_code):
-    audio = np.array([], dtype=np.float32)
-    for symbol in morse_code:
-        if symbol == '.':
-            audio = np.concatenate((audio, generate_tone(FREQUENCY, DOT_DURATION, SAMPLE_RATE)))
-        elif symbol == '-':
-            audio = np.concatenate((audio, generate_tone(FREQUENCY, DASH_DURATION, SAMPLE_RATE)))
-        elif symbol == ' ':
-            audio = np.concatenate((audio, np.zeros(int(SAMPLE_RATE * DOT_DURATION))))
-        elif symbol == '/':
-            audio = np.concatenate((audio, np.zeros(int(SAMPLE_RATE * DASH_DURATION))))
-        audio = np.concatenate((audio, np.zeros(int(SAMPLE_RATE * DOT_DURATION))))  # Space between symbols
+@lru_cache(maxsize=None)
+def keyed_tone(frequency, duration, sample_rate, ramp_duration=0.0):
+    # Cached dot/dash waveform with optional raised-cosine keying ramps against clicks
+    tone = generate_tone(frequency, duration, sample_rate).astype(np.float32)
+    n_ramp = min(int(sample_rate * ramp_duration), len(tone) // 2)
+    if n_ramp > 0:
+        ramp = 0.5 * (1 - np.cos(np.pi * np.arange(n_ramp) / n_ramp))
+        tone[:n_ramp] *= ramp
+        tone[len(tone) - n_ramp:] *= ramp[::-1]
+    tone.flags.writeable = False
+    return tone
+
+def symbol_lengths(sample_rate):
+    # Samples of tone and total samples (tone, pause and space between symbols) per ASCII code
+    dot = int(sample_rate * DOT_DURATION)
+    dash = int(sample_rate * DASH_DURATION)
+    tone = np.zeros(128, dtype=np.int64)
+    total = np.full(128, dot, dtype=np.int64)
+    tone[ord('.')], total[ord('.')] = dot, 2 * dot
+    tone[ord('-')], total[ord('-')] = dash, dash + dot
+    total[ord(' ')] = 2 * dot
+    total[ord('/')] = dash + dot
+    return tone, total
+
+def generate_morse_audio(morse_code, ramp_duration=0.0, frequency=FREQUENCY, sample_rate=SAMPLE_RATE):
+    codes = np.fromiter(map(ord, morse_code), dtype=np.int64, count=len(morse_code))
+    codes[codes >= 128] = 0
+    _, total = symbol_lengths(sample_rate)
+    lengths = total[codes]
+    offsets = np.cumsum(lengths) - lengths
+
+    audio = np.zeros(int(np.sum(lengths)), dtype=np.float32)
+    for symbol, duration in (('.', DOT_DURATION), ('-', DASH_DURATION)):
+        tone = keyed_tone(frequency, duration, sample_rate, ramp_duration)
+        for offset in offsets[codes == ord(symbol)]:
+            audio[offset:offset + len(tone)] = tone
+    return audio
+
+def iter_morse_blocks(morse_code, ramp_duration=0.0, symbols_per_block=256, sample_rate=SAMPLE_RATE):
+    # Every symbol carries its own trailing pause, so synthesizing slices of the Morse
+    # string one after another gives exactly the same samples as the whole string
+    for symbols in iter_symbol_chunks(morse_code, symbols_per_block):
+        yield generate_morse_audio(symbols, ramp_duration, sample_rate=sample_rate)
+
+def stream_morse_wave(filename, morse_code, sample_rate=SAMPLE_RATE, ramp_duration=0.0):
+    with WaveWriter(filename, sample_rate) as writer:
+        writer.write_blocks(iter_morse_blocks(morse_code, ramp_duration, sample_rate=sample_rate))
+
+def stripe_text(text, n_carriers):
+    # Morse code per carrier, character i goes to carrier i % n_carriers
+    chars = [char for char in text.upper() if char in MORSE_CODE_DICT]
+    return [' '.join(MULTICARRIER_SPACE_CODE if char == ' ' else MORSE_CODE_DICT[char]
+                     for char in chars[carrier::n_carriers])
+            for carrier in range(n_carriers)]
+
+def generate_multicarrier_audio(text, carriers=CARRIERS, ramp_duration=0.005, sample_rate=SAMPLE_RATE):
+    # Sums one keyed carrier per stripe. The ramps keep keying clicks from
+    # splattering onto the neighbouring carriers.
+    streams = [generate_morse_audio(morse_code, ramp_duration, frequency, sample_rate)
+               for morse_code, frequency in zip(stripe_text(text, len(carriers)), carriers)]
+    audio = np.zeros(max(len(stream) for stream in streams), dtype=np.float32)
+    for stream in streams:
+        audio[:len(stream)] += stream
+    audio /= len(carriers)
     return audio
 
 def save_wave(filename, audio, sample_rate):
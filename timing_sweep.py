@@ -0,0 +1,51 @@
+import argparse
+import sys
+
+import numpy as np
+
+from audio_io import decimate
+from audio_to_phonenumber import DTMF_BAND, decode_phone_audio
+from channel import add_awgn
+from dtmf_timing import DTMFTiming
+from phonenumber_to_audio import DIGITS, encode_phone_number
+
+TONE_LENGTHS = (0.5, 0.3, 0.2, 0.15, 0.1, 0.08, 0.06, 0.05, 0.04, 0.03, 0.02)
+
+
+def symbol_errors(sent, received):
+    return sum(a != b for a, b in zip(sent, received)) + abs(len(sent) - len(received))
+
+def sweep(snr_db, n_digits=200, gap_ratio=1.0, sample_rate=44100, tone_lengths=TONE_LENGTHS, seed=0):
+    # Yields (timing, symbol errors) from the slowest to the fastest timing
+    rng = np.random.default_rng(seed)
+    digits = ''.join(rng.choice(list(DIGITS), n_digits))
+    for tone in tone_lengths:
+        timing = DTMFTiming(tone, tone * gap_ratio)
+        # Leading and trailing silence as on a real link
+        audio = np.concatenate((np.zeros(int(sample_rate * timing.gap)),
+                                encode_phone_number(digits, sample_rate, timing)))
+        received = decode_phone_audio(*decimate(add_awgn(audio, snr_db, rng), sample_rate, band=DTMF_BAND))
+        yield timing, symbol_errors(digits, received)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find the fastest DTMF timing that decodes error-free at a given SNR.")
+    parser.add_argument('--snr', type=float, default=10.0, help="signal to noise ratio in dB")
+    parser.add_argument('--digits', type=int, default=200)
+    parser.add_argument('--gap-ratio', type=float, default=1.0, help="gap length relative to the tone length")
+    parser.add_argument('--sample-rate', type=int, default=44100)
+    args = parser.parse_args(argv)
+
+    fastest = None
+    for timing, errors in sweep(args.snr, args.digits, args.gap_ratio, args.sample_rate):
+        print(f"tone {timing.tone * 1000:5.0f} ms  gap {timing.gap * 1000:5.0f} ms  "
+              f"{timing.symbol_rate():6.2f} symbols/s  {errors} errors")
+        if errors == 0:
+            fastest = timing
+    if fastest is None:
+        print(f"No timing decoded error-free at {args.snr} dB")
+    else:
+        print(f"Fastest error-free timing at {args.snr} dB: tone {fastest.tone * 1000:.0f} ms, "
+              f"gap {fastest.gap * 1000:.0f} ms ({fastest.symbol_rate():.2f} symbols/s)")
+
+if __name__ == "__main__":
+    sys.exit(main())